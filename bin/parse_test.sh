@@ -12,9 +12,16 @@
 
 ## Paths
 CONFIG_PATH="$HOME/.eqa/config.json"
+STATE_PATH="$HOME/.eqa/state.jsonl"
 EQ_LOGS=$(jq '.settings.paths.char_log' ${CONFIG_PATH})
-DEFAULT_CHAR=$(jq '.last_state.character' ${CONFIG_PATH} | tr -d '"')
-DEFAULT_SERVER=$(jq '.last_state.server' ${CONFIG_PATH} | tr -d '"')
+## The state journal's last record is the current character
+DEFAULT_CHAR=$(tail -n 1 ${STATE_PATH} 2>/dev/null | jq -r '.character' 2>/dev/null)
+DEFAULT_SERVER=$(tail -n 1 ${STATE_PATH} 2>/dev/null | jq -r '.server' 2>/dev/null)
+## No journal yet, fall back to the config
+if [ -z "${DEFAULT_CHAR}" ] || [ "${DEFAULT_CHAR}" = "null" ]; then
+  DEFAULT_CHAR=$(jq -r '.last_state.character' ${CONFIG_PATH})
+  DEFAULT_SERVER=$(jq -r '.last_state.server' ${CONFIG_PATH})
+fi
 CHAR_LOG="${EQ_LOGS//\"}eqlog_${DEFAULT_CHAR^}_${DEFAULT_SERVER}.txt"
 
 ## Colors
@@ -0,0 +1,217 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/bench/generate.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+   Generate synthetic character logs
+
+   python -m eqa.bench.generate out.txt --lines 100000 --mix melee=60,chat=20
+"""
+
+import argparse
+import datetime
+import random
+
+
+# Line shapes by category, filled in from the word lists below
+TEMPLATES = {
+    "melee": [
+        "{mob} {verbs} YOU for {n} points of damage.",
+        "{mob} {verbs} {name} for {n} points of damage.",
+        "{name} {verbs} {mob} for {n} points of damage.",
+        "You {verb} {mob} for {n} points of damage.",
+        "{mob} tries to {verb} YOU, but misses!",
+        "{mob} tries to {verb} {name}, but {name} dodges!",
+        "{mob} tries to {verb} {name}, but {name} parries!",
+        "{mob} tries to {verb} {name}, but {name} blocks!",
+        "{mob} tries to {verb} {name}, but {name} ripostes!",
+        "You try to {verb} {mob}, but miss!",
+        "{name} Scores a critical hit!({n})",
+        "{mob} has been slain by {name}!",
+        "You have slain {mob}!",
+        "{mob} has become ENRAGED.",
+        "{mob} is no longer enraged.",
+        "{mob} goes on a RAMPAGE.",
+        "You gain party experience!!",
+        "{mob} engages {name}!",
+    ],
+    "spell": [
+        "{name} begins to cast a spell.",
+        "You begin casting {spell}.",
+        "Your spell fizzles!",
+        "{name}'s spell fizzles!",
+        "Your spell is interrupted.",
+        "{name}'s casting is interrupted!",
+        "Your target resisted the {spell} spell.",
+        "{mob} was hit by non-melee for {n} points of damage.",
+        "Your {spell} spell has worn off.",
+        "You have healed {name} for {n} points of damage.",
+        "{name} begins to regenerate.",
+        "Beginning to memorize {spell}...",
+        "You have finished memorizing {spell}.",
+        "You forget {spell}.",
+        "Your target has been cured.",
+    ],
+    "chat": [
+        "{name} tells you, '{text}'",
+        "{name} says, '{text}'",
+        "{name} shouts, '{text}'",
+        "{name} tells the guild, '{text}'",
+        "{name} tells the group, '{text}'",
+        "{name} says out of character, '{text}'",
+        "{name} auctions, 'WTS {item} {n}p'",
+        "{name} auctions, 'WTB {item}'",
+        "You told {name}, '{text}'",
+        "You say, '{text}'",
+        "You say to your guild, '{text}'",
+        "You tell your party, '{text}'",
+        "You auction, 'WTS {item}'",
+    ],
+    "who": [
+        "Players in EverQuest:",
+        "---------------------------",
+        "[{level} {klass}] {name} ({race}) <{guild}> ZONE: {zone_code}",
+        "[{level} {klass}] {name} ({race})",
+        "AFK [{level} {klass}] {name} ({race}) <{guild}>",
+        "[ANONYMOUS] {name} <{guild}>",
+        "There are {n} players in EverQuest.",
+    ],
+    "system": [
+        "Your Location is {y}, {x}, {z}",
+        "You think you are heading {direction}.",
+        "You have entered {zone}.",
+        "LOADING, PLEASE WAIT...",
+        "You are hungry.",
+        "You are thirsty.",
+        "{name} has joined the group.",
+        "{name} has left the group.",
+        "Targeted (NPC): {mob}",
+        "You no longer have a target.",
+        "You have become better at {skill}! ({n})",
+        "--You have looted {item}.--",
+        "**A Magic Die is rolled by {name}.",
+    ],
+    "noise": [
+        "{name} has fallen to the ground.",
+        "You feel a little lighter.",
+        "{mob} looks at you with indifference.",
+        "Your {item} has been sold for {n} copper.",
+        "{name} has been awarded {item}.",
+        "You cannot see your target.",
+        "{mob} has been mesmerized.",
+        "You regain some mana.",
+        "You were hit by non-melee for {n} damage.",
+        "Your faction standing with {guild} has been adjusted by {n}.",
+    ],
+}
+
+# Default share of each category
+MIX = {"melee": 45, "spell": 20, "chat": 15, "who": 5, "system": 10, "noise": 5}
+
+WORDS = {
+    "name": ["Parser", "Parsette", "Soandso", "Valreth", "Indefinite", "Dagner"],
+    "mob": ["a gnoll", "a dracoliche", "an orc pawn", "Lord Nagafen", "a froglok"],
+    "verb": ["hit", "slash", "crush", "pierce", "kick", "bash", "punch"],
+    "verbs": ["hits", "slashes", "crushes", "pierces", "kicks", "bashes", "bites"],
+    "spell": ["Ensnare", "Complete Heal", "Spirit of Wolf", "Bedlam", "Gate"],
+    "text": ["incoming", "train to zone", "need a rez please", "huzzah", "inc"],
+    "item": ["Shrunken Goblin Skull Earring", "Fine Steel Sword", "Bone Chips"],
+    "klass": ["Warrior", "Cleric", "Enchanter", "Shaman", "Paladin", "Druid"],
+    "race": ["Wood Elf", "Gnome", "Human", "Iksar", "Dark Elf", "Troll"],
+    "guild": ["Tempest", "Clan Runny Eye", "Seekers"],
+    "zone": ["The Wakening Lands", "Kael Drakkel", "Butcherblock Mountains"],
+    "zone_code": ["commons", "gfaydark", "kael", "wakening"],
+    "direction": ["North", "NorthEast", "East", "South", "SouthWest", "West"],
+    "skill": ["Offense", "Defense", "Channeling", "Abjuration"],
+}
+
+
+def parse_mix(text):
+    """Turn "melee=60,chat=20" into a category weight dict"""
+    mix = {}
+    for part in text.split(","):
+        category, weight = part.split("=")
+        if category not in TEMPLATES:
+            raise ValueError("unknown category " + category)
+        mix[category] = float(weight)
+
+    return mix
+
+
+def payloads(count, mix=None, seed=0):
+    """Yield count random payloads, without timestamps"""
+    rnd = random.Random(seed)
+    mix = mix or MIX
+    categories = list(mix.keys())
+    weights = [mix[category] for category in categories]
+    for category in rnd.choices(categories, weights, k=count):
+        template = rnd.choice(TEMPLATES[category])
+        values = {key: rnd.choice(words) for key, words in WORDS.items()}
+        values.update(
+            n=rnd.randint(1, 999),
+            level=rnd.randint(1, 65),
+            y="{:.2f}".format(rnd.uniform(-3000, 3000)),
+            x="{:.2f}".format(rnd.uniform(-3000, 3000)),
+            z="{:.2f}".format(rnd.uniform(-300, 300)),
+        )
+        yield category, template.format(**values)
+
+
+def lines(count, mix=None, seed=0, rate=20, start=None):
+    """
+    Yield count log lines, timestamped from start at about rate lines per
+    second of game time.
+    """
+    rnd = random.Random(seed + 1)
+    clock = start or datetime.datetime(2022, 10, 12, 20, 0, 0)
+    for category, payload in payloads(count, mix, seed):
+        if rnd.random() < 1 / rate:
+            clock += datetime.timedelta(seconds=1)
+        yield clock.strftime("[%a %b %d %H:%M:%S %Y] ") + payload
+
+
+def write(path, count, mix=None, seed=0, rate=20):
+    """Write a synthetic log to path"""
+    log_file = open(path, "w", encoding="utf-8")
+    for line in lines(count, mix, seed, rate):
+        log_file.write(line + "\n")
+    log_file.close()
+
+
+def main(argv=None):
+    """Write a synthetic log"""
+    parser = argparse.ArgumentParser(
+        prog="python -m eqa.bench.generate",
+        description="Write a synthetic EQ character log",
+    )
+    parser.add_argument("path", help="file to write")
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=MIX,
+        help="category weights, e.g. melee=60,spell=20,chat=10,who=5,noise=5",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=20, help="lines per second")
+    args = parser.parse_args(argv)
+
+    write(args.path, args.lines, args.mix, args.seed, args.rate)
+
+
+if __name__ == "__main__":
+    main()
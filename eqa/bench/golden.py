@@ -0,0 +1,288 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/bench/golden.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+   Check the parser and action stage against a corpus of expected results
+
+   python -m eqa.bench.golden
+   python -m eqa.bench.golden --record new_lines.txt
+   python -m eqa.bench.golden --determine mymodule:determine
+"""
+
+import argparse
+import importlib
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+
+import eqa.lib.action as eqa_action
+import eqa.lib.config as eqa_config
+import eqa.lib.parser as eqa_parser
+import eqa.lib.replay as eqa_replay
+import eqa.lib.snapshot as eqa_snapshot
+import eqa.lib.struct as eqa_struct
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden.jsonl")
+CORPUS_VERSION = 1
+
+# Compared parts of a record, anything else in it is left alone
+CHECKED = ["type", "fields", "actions"]
+
+
+class EQA_Stage:
+    """Run single messages through the action stage of a default config"""
+
+    def __init__(self):
+        """Build a default config in a scratch directory"""
+        self.work_path = tempfile.mkdtemp(prefix="eqa-golden-") + "/"
+        eqa_config.init(self.work_path)
+        snapshots = eqa_snapshot.EQA_Snapshots(eqa_action.build_plans)
+        self.snapshot = snapshots.publish(eqa_config.read_config(self.work_path))
+
+    def act(self, line_type, line, fields, raid=False):
+        """
+        Return what the action stage produces for one line, by queue, with
+        wall clock timestamps left out
+        """
+        system_q = queue.Queue()
+        display_q = queue.Queue()
+        sound_q = queue.Queue()
+        raid_flag = threading.Event()
+        if raid:
+            raid_flag.set()
+        undetermined = eqa_replay.EQA_Counter()
+        ctx = eqa_action.context(
+            system_q,
+            display_q,
+            sound_q,
+            raid_flag,
+            self.snapshot,
+            self.work_path,
+            undetermined,
+        )
+        eqa_action.handle(
+            eqa_struct.message("00:00:00.00", line_type, "null", "null", line, fields),
+            ctx,
+        )
+
+        actions = []
+        for event in drain(sound_q):
+            actions.append(["sound", event.sound, event.payload])
+        for event in drain(display_q):
+            actions.append(["display", event.type, event.screen, event.payload])
+        for event in drain(system_q):
+            actions.append(["system", event.tx, event.payload])
+        for undetermined_line in undetermined.counts:
+            actions.append(["undetermined", undetermined_line])
+
+        # Compare as the corpus stores it, tuples become lists
+        return json.loads(json.dumps(actions))
+
+    def close(self):
+        """Remove the scratch directory"""
+        eqa_config.flush(self.work_path)
+        shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+def drain(q):
+    """Everything on q"""
+    items = []
+    while not q.empty():
+        items.append(q.get_nowait())
+
+    return items
+
+
+def expected(stage, line, determine, raid=False):
+    """The record for line as the code stands"""
+    line_type, fields = determine(line)
+    record = {"line": line, "type": line_type, "fields": fields}
+    if raid:
+        record["raid"] = True
+    record["actions"] = stage.act(line_type, line, fields, raid)
+
+    return record
+
+
+def read_corpus(path):
+    """Return the records of a corpus"""
+    records = []
+    corpus_file = open(path, "r", encoding="utf-8")
+    for number, raw in enumerate(corpus_file, 1):
+        record = json.loads(raw)
+        if number == 1:
+            if record.get("version") != CORPUS_VERSION:
+                raise ValueError(
+                    path + " is corpus version " + str(record.get("version"))
+                )
+            continue
+        records.append(record)
+    corpus_file.close()
+
+    return records
+
+
+def write_corpus(path, records):
+    """Write records, one JSON object per line after a version header"""
+    text = json.dumps({"version": CORPUS_VERSION}) + "\n"
+    for record in records:
+        text += json.dumps(record, ensure_ascii=False) + "\n"
+    eqa_config.write_atomic(path, text)
+
+
+def check(records, determine=None):
+    """Return (record, actual) for every record the code disagrees with"""
+    determine = determine or eqa_parser.determine
+    stage = EQA_Stage()
+    try:
+        differences = []
+        for record in records:
+            actual = expected(stage, record["line"], determine, record.get("raid"))
+            if any(record[key] != actual[key] for key in CHECKED):
+                differences.append((record, actual))
+    finally:
+        stage.close()
+
+    return differences
+
+
+def record_lines(path, records, determine=None):
+    """Add the lines of path not yet in records, expecting what the code does"""
+    determine = determine or eqa_parser.determine
+    known = set((record["line"], bool(record.get("raid"))) for record in records)
+    stage = EQA_Stage()
+    added = 0
+    try:
+        lines_file = open(path, "r", encoding="utf-8", errors="replace")
+        for raw in lines_file:
+            line = raw.strip()
+            # Char log lines are recorded without their timestamp
+            header = eqa_parser.decode_header(line)
+            if header is not None:
+                line = header[2]
+            # "raid<tab>line" records a line with raid mode on
+            raid = line.startswith("raid\t")
+            if raid:
+                line = line[5:]
+            if not line or (line, raid) in known:
+                continue
+            known.add((line, raid))
+            records.append(expected(stage, line, determine, raid))
+            added += 1
+        lines_file.close()
+    finally:
+        stage.close()
+
+    return added
+
+
+def coverage(records):
+    """Line types in the parser not expected by any record"""
+    covered = set(record["type"] for record in records)
+
+    return [
+        line_type
+        for family, rules in eqa_parser.LINE_PATTERNS
+        for line_type, pattern in rules
+        if line_type not in covered
+    ]
+
+
+def report(differences, limit=20):
+    """Format differences"""
+    output = []
+    for record, actual in differences[:limit]:
+        output.append(record["line"] + (" (raid)" if record.get("raid") else ""))
+        for key in CHECKED:
+            if record[key] != actual[key]:
+                output.append("  " + key + " expected: " + json.dumps(record[key]))
+                output.append("  " + key + "   actual: " + json.dumps(actual[key]))
+    if len(differences) > limit:
+        output.append("... and " + str(len(differences) - limit) + " more")
+
+    return "\n".join(output)
+
+
+def load_determine(name):
+    """Import a module:function to use in place of parser.determine"""
+    module_name, function_name = name.split(":")
+
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def main(argv=None):
+    """Check the corpus, or add to it"""
+    parser = argparse.ArgumentParser(
+        prog="python -m eqa.bench.golden",
+        description="Check parser.determine and the action stage against a corpus",
+    )
+    parser.add_argument("--corpus", default=CORPUS, help="corpus to use")
+    parser.add_argument(
+        "--record",
+        help="add lines of this file, or char log, expecting current results",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="rewrite every expectation from current results",
+    )
+    parser.add_argument(
+        "--determine",
+        type=load_determine,
+        help="module:function to check in place of parser.determine",
+    )
+    args = parser.parse_args(argv)
+
+    records = read_corpus(args.corpus) if os.path.isfile(args.corpus) else []
+
+    if args.record:
+        added = record_lines(args.record, records, args.determine)
+        write_corpus(args.corpus, records)
+        print("Recorded " + str(added) + " lines, " + str(len(records)) + " in corpus")
+        return
+
+    differences = check(records, args.determine)
+    if args.update:
+        for record, actual in differences:
+            record.update((key, actual[key]) for key in CHECKED)
+        write_corpus(args.corpus, records)
+        print("Updated " + str(len(differences)) + " of " + str(len(records)))
+        return
+
+    missing = coverage(records)
+    print(
+        str(len(records))
+        + " lines, "
+        + str(len(differences))
+        + " differences, "
+        + str(len(missing))
+        + " line types without a line"
+        + (": " + ", ".join(missing) if missing else "")
+    )
+    if differences:
+        print(report(differences))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
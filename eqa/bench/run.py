@@ -0,0 +1,418 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/bench/run.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+   Measure parser throughput, latency and memory
+
+   python -m eqa.bench.run --lines 20000 --output results.json
+   python -m eqa.bench.run --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import queue
+import resource
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import eqa.bench.generate as eqa_generate
+import eqa.lib.action as eqa_action
+import eqa.lib.classifier as eqa_classifier
+import eqa.lib.config as eqa_config
+import eqa.lib.log as eqa_log
+import eqa.lib.parser as eqa_parser
+import eqa.lib.replay as eqa_replay
+import eqa.lib.settings as eqa_settings
+import eqa.lib.snapshot as eqa_snapshot
+
+
+STAGES = ["determine", "process", "pipeline"]
+
+# Longest wait for a batch to come out the far end before giving up
+STALL_TIMEOUT = 30.0
+
+
+class EQA_Timed_Queue(queue.Queue):
+    """Queue recording when each item is put and finished"""
+
+    def __init__(self):
+        """Start empty"""
+        super().__init__()
+        self.puts = []
+        self.done = []
+        self.progress = threading.Condition()
+
+    def put(self, item, block=True, timeout=None):
+        """Put item, noting the time"""
+        if item is not eqa_settings.WAKE:
+            with self.progress:
+                self.puts.append(time.perf_counter_ns())
+                self.progress.notify_all()
+        super().put(item, block, timeout)
+
+    def task_done(self):
+        """Finish an item, noting the time"""
+        with self.progress:
+            self.done.append(time.perf_counter_ns())
+            self.progress.notify_all()
+        super().task_done()
+
+    def wait(self, times, count, timeout=STALL_TIMEOUT):
+        """Block until times, puts or done, holds count entries"""
+        with self.progress:
+            if not self.progress.wait_for(lambda: len(times) >= count, timeout):
+                raise RuntimeError(
+                    "stalled at " + str(len(times)) + " of " + str(count) + " lines"
+                )
+
+
+def summary(lines, elapsed_ns, latencies):
+    """Throughput and latency percentiles of a run"""
+    latencies = sorted(latencies)
+
+    def percentile(fraction):
+        return latencies[int(round(fraction * (len(latencies) - 1)))] / 1000
+
+    return {
+        "lines": lines,
+        "seconds": round(elapsed_ns / 1e9, 4),
+        "lines_per_sec": round(lines / (elapsed_ns / 1e9), 1),
+        "p50_us": round(percentile(0.50), 2),
+        "p99_us": round(percentile(0.99), 2),
+        "max_us": round(percentile(1.0), 2),
+    }
+
+
+def bench_determine(config, lines, batch, work_path):
+    """Time parser.determine on each payload"""
+    payloads = [eqa_parser.decode_header(line)[2] for line in lines]
+    eqa_parser.classifier.set_cache_size(eqa_parser.cache_size(config))
+    latencies = []
+    started = time.perf_counter_ns()
+    for payload in payloads:
+        line_started = time.perf_counter_ns()
+        eqa_parser.determine(payload)
+        latencies.append(time.perf_counter_ns() - line_started)
+
+    return summary(len(lines), time.perf_counter_ns() - started, latencies)
+
+
+def bench_process(config, lines, batch, work_path):
+    """
+    Time parser.process, from a batch landing on log_q to each of its
+    messages landing on action_q
+    """
+    log_q = queue.Queue()
+    action_q = EQA_Timed_Queue()
+    exit_flag = threading.Event()
+    snapshots = eqa_snapshot.EQA_Snapshots(eqa_action.build_plans)
+    snapshots.publish(config)
+    counter = eqa_replay.EQA_Counter()
+    threads = [
+        threading.Thread(
+            target=eqa_parser.process, args=(snapshots, exit_flag, log_q, action_q)
+        ),
+        threading.Thread(
+            target=eqa_replay.drain,
+            args=(action_q, exit_flag, counter, lambda message: message.type),
+        ),
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    latencies = []
+    started = time.perf_counter_ns()
+    try:
+        for first in range(0, len(lines), batch):
+            chunk = lines[first : first + batch]
+            batch_started = time.perf_counter_ns()
+            log_q.put(chunk)
+            action_q.wait(action_q.puts, first + len(chunk))
+            for put in action_q.puts[first : first + len(chunk)]:
+                latencies.append(put - batch_started)
+        elapsed = time.perf_counter_ns() - started
+    finally:
+        exit_flag.set()
+        eqa_settings.wake(log_q, action_q)
+        for thread in threads:
+            thread.join()
+
+    return summary(len(lines), elapsed, latencies)
+
+
+def bench_pipeline(config, lines, batch, work_path):
+    """
+    Time log.process, parser.process and action.process together, from a
+    batch being written to the char log to the action stage finishing each
+    of its lines
+    """
+    char_log = work_path + "eqlog_Bench_server.txt"
+    open(char_log, "w").close()
+    log_q = queue.Queue()
+    action_q = EQA_Timed_Queue()
+    system_q = queue.Queue()
+    display_q = queue.Queue()
+    sound_q = queue.Queue()
+    exit_flag = threading.Event()
+    log_reload = threading.Event()
+    raid = threading.Event()
+    snapshots = eqa_snapshot.EQA_Snapshots(eqa_action.build_plans)
+    snapshots.publish(config)
+    counter = eqa_replay.EQA_Counter()
+
+    threads = [
+        threading.Thread(
+            target=eqa_log.process, args=(log_reload, exit_flag, char_log, log_q)
+        ),
+        threading.Thread(
+            target=eqa_parser.process, args=(snapshots, exit_flag, log_q, action_q)
+        ),
+        threading.Thread(
+            target=eqa_action.process,
+            args=(
+                action_q,
+                system_q,
+                display_q,
+                sound_q,
+                exit_flag,
+                raid,
+                snapshots,
+                work_path,
+                counter,
+            ),
+        ),
+    ]
+    for q, key in (
+        (system_q, lambda event: event.tx),
+        (display_q, lambda event: event.type),
+        (sound_q, lambda event: event.sound),
+    ):
+        threads.append(
+            threading.Thread(target=eqa_replay.drain, args=(q, exit_flag, counter, key))
+        )
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    log_file = open(char_log, "a", encoding="utf-8")
+    latencies = []
+    try:
+        # The tailer starts at the end of the log, write until it is reading
+        while True:
+            log_file.write(lines[0] + "\n")
+            log_file.flush()
+            try:
+                action_q.wait(action_q.done, 1, timeout=1)
+                break
+            except RuntimeError:
+                continue
+        log_q.join()
+        action_q.join()
+        base = len(action_q.done)
+
+        started = time.perf_counter_ns()
+        for first in range(0, len(lines), batch):
+            chunk = lines[first : first + batch]
+            batch_started = time.perf_counter_ns()
+            log_file.write("\n".join(chunk) + "\n")
+            log_file.flush()
+            action_q.wait(action_q.done, base + first + len(chunk))
+            for done in action_q.done[base + first : base + first + len(chunk)]:
+                latencies.append(done - batch_started)
+        elapsed = time.perf_counter_ns() - started
+    finally:
+        log_file.close()
+        exit_flag.set()
+        eqa_settings.wake(log_q, action_q, system_q, display_q, sound_q)
+        for thread in threads:
+            thread.join()
+        eqa_config.flush(work_path)
+
+    return summary(len(lines), elapsed, latencies)
+
+
+BENCHMARKS = {
+    "determine": bench_determine,
+    "process": bench_process,
+    "pipeline": bench_pipeline,
+}
+
+
+def measure(stage, config, lines, batch, work_path, memory):
+    """
+    Run a stage on a fresh classifier. With memory, run it again under
+    tracemalloc for the peak it allocates, tracing slows it too much to
+    time in the same run.
+    """
+    eqa_parser.classifier = eqa_classifier.EQA_Classifier(eqa_parser.LINE_PATTERNS)
+    result = BENCHMARKS[stage](config, lines, batch, work_path)
+    if memory:
+        eqa_parser.classifier = eqa_classifier.EQA_Classifier(eqa_parser.LINE_PATTERNS)
+        tracemalloc.start()
+        BENCHMARKS[stage](config, lines, batch, work_path)
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    # High water mark of the whole process so far, not just this stage
+    result["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return result
+
+
+def version():
+    """Installed eqalert version"""
+    try:
+        from importlib.metadata import version as package_version
+
+        return package_version("eqalert")
+    except Exception:
+        return "unknown"
+
+
+def run(lines, stages, batch=64, cache_size=None, memory=True):
+    """Run stages over lines in a scratch config and return their results"""
+    work_path = tempfile.mkdtemp(prefix="eqa-bench-") + "/"
+    try:
+        eqa_config.init(work_path)
+        config = eqa_config.read_config(work_path)
+        if cache_size is not None:
+            config["settings"]["parser"]["cache_size"] = cache_size
+        results = {}
+        for stage in stages:
+            results[stage] = measure(stage, config, lines, batch, work_path, memory)
+    finally:
+        eqa_config.flush(work_path)
+        shutil.rmtree(work_path, ignore_errors=True)
+
+    return results, eqa_parser.cache_size(config)
+
+
+def report(results, previous=None):
+    """Format results, with the change from previous results if given"""
+    output = []
+    for stage, result in results.items():
+        line = (
+            stage.ljust(10)
+            + "{:>12,.0f} lines/sec".format(result["lines_per_sec"])
+            + "  p50 "
+            + "{:>9.2f}us".format(result["p50_us"])
+            + "  p99 "
+            + "{:>9.2f}us".format(result["p99_us"])
+        )
+        if "peak_bytes" in result:
+            line += "  peak " + "{:>8.1f}KiB".format(result["peak_bytes"] / 1024)
+        output.append(line)
+        if previous is not None and stage in previous:
+            before = previous[stage]
+            output.append(
+                " " * 10
+                + "{:>+11.1%} lines/sec".format(
+                    result["lines_per_sec"] / before["lines_per_sec"] - 1
+                )
+                + "  p50 "
+                + "{:>+10.1%}".format(result["p50_us"] / before["p50_us"] - 1)
+                + "  p99 "
+                + "{:>+10.1%}".format(result["p99_us"] / before["p99_us"] - 1)
+            )
+
+    return "\n".join(output)
+
+
+def main(argv=None):
+    """Benchmark the parser and write the results"""
+    parser = argparse.ArgumentParser(
+        prog="python -m eqa.bench.run",
+        description="Measure parser throughput, latency and memory",
+    )
+    parser.add_argument("--lines", type=int, default=20000, help="lines generated")
+    parser.add_argument(
+        "--mix",
+        type=eqa_generate.parse_mix,
+        default=eqa_generate.MIX,
+        help="category weights, e.g. melee=60,spell=20,chat=10,who=5,noise=5",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log", help="benchmark an existing char log instead")
+    parser.add_argument(
+        "--stages",
+        type=lambda text: text.split(","),
+        default=STAGES,
+        help="comma separated, from " + ",".join(STAGES),
+    )
+    parser.add_argument("--batch", type=int, default=64, help="lines per write")
+    parser.add_argument("--cache-size", type=int, help="parser skeleton cache size")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the tracemalloc passes"
+    )
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="results JSON of an earlier run")
+    args = parser.parse_args(argv)
+
+    for stage in args.stages:
+        if stage not in BENCHMARKS:
+            parser.error("unknown stage " + stage)
+
+    if args.log:
+        log_file = open(args.log, "r", encoding="utf-8", errors="replace")
+        lines = [
+            line.strip()
+            for line in log_file
+            if eqa_parser.decode_header(line.strip()) is not None
+        ]
+        log_file.close()
+    else:
+        lines = list(eqa_generate.lines(args.lines, args.mix, args.seed))
+
+    results, cache_size = run(
+        lines, args.stages, args.batch, args.cache_size, not args.no_memory
+    )
+
+    previous = None
+    if args.compare:
+        compare_file = open(args.compare, "r", encoding="utf-8")
+        previous = json.load(compare_file)["results"]
+        compare_file.close()
+    print(report(results, previous))
+
+    if args.output:
+        output = {
+            "eqalert": version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "source": os.path.abspath(args.log) if args.log else "generated",
+            "lines": len(lines),
+            "mix": None if args.log else args.mix,
+            "seed": None if args.log else args.seed,
+            "batch": args.batch,
+            "cache_size": cache_size,
+            "results": results,
+        }
+        output_file = open(args.output, "w", encoding="utf-8")
+        json.dump(output, output_file, indent=2)
+        output_file.write("\n")
+        output_file.close()
+
+
+if __name__ == "__main__":
+    main()
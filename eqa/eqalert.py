@@ -25,7 +25,6 @@ import os
 import pkg_resources
 import sys
 import threading
-import time
 import queue
 
 import eqa.lib.action as eqa_action
@@ -34,10 +33,14 @@ import eqa.lib.curses as eqa_curses
 import eqa.lib.keys as eqa_keys
 import eqa.lib.log as eqa_log
 import eqa.lib.parser as eqa_parser
+import eqa.lib.replay as eqa_replay
 import eqa.lib.settings as eqa_settings
+import eqa.lib.sink as eqa_sink
+import eqa.lib.snapshot as eqa_snapshot
 import eqa.lib.sound as eqa_sound
 import eqa.lib.state as eqa_state
 import eqa.lib.struct as eqa_struct
+import eqa.lib.tts as eqa_tts
 
 
 def bootstrap(base_path):
@@ -56,21 +59,22 @@ def bootstrap(base_path):
             print("    - making a place for logs")
             os.makedirs(base_path + "log/")
 
-        # Make some sounds
-        sound_directory = base_path + "sound/"
-        if not os.path.exists(sound_directory):
-            print("    - making some sounds")
-            os.makedirs(base_path + "sound/")
-            eqa_sound.speak("hello", "false", sound_directory)
-            eqa_sound.speak("hey", "false", sound_directory)
-            eqa_sound.speak("listen", "false", sound_directory)
-            eqa_sound.speak("look", "false", sound_directory)
-            eqa_sound.speak("watch out", "false", sound_directory)
-
         # Generating a config file
         print("    - generating json config")
         eqa_config.init(base_path)
         eqa_config.update_logs(base_path)
+        eqa_config.flush(base_path)
+
+        # Make some sounds
+        sound_directory = base_path + "sound/"
+        if not os.path.exists(sound_directory):
+            print("    - making some sounds")
+            os.makedirs(sound_directory)
+            config = eqa_config.read_config(base_path)
+            for sound_file in config["settings"]["sounds"].values():
+                eqa_tts.make_sound(
+                    config, sound_file.rsplit(".", 1)[0], sound_directory + sound_file
+                )
 
     except Exception as e:
         print(
@@ -89,6 +93,11 @@ def main():
     home = os.path.expanduser("~")
     base_path = home + "/.eqa/"
 
+    # Replay an existing log instead of watching one
+    if len(sys.argv) > 1 and sys.argv[1] == "replay":
+        eqa_replay.main(sys.argv[2:], base_path)
+        return
+
     # Queues
     keyboard_q = queue.Queue()
     action_q = queue.Queue()
@@ -103,7 +112,6 @@ def main():
 
     # Thread Events
     raid = threading.Event()
-    cfg_reload = threading.Event()
     log_reload = threading.Event()
     exit_flag = threading.Event()
 
@@ -111,13 +119,11 @@ def main():
     logging.basicConfig(filename=base_path + "log/eqalert.log", level=logging.INFO)
     eqa_config.update_logs(base_path)
     config = eqa_config.read_config(base_path)
-    server = config["last_state"]["server"]
-    char = config["last_state"]["character"]
+    state = eqa_config.get_last_state(base_path)
     char_log = (
         config["settings"]["paths"]["char_log"]
-        + config["char_logs"][char + "_" + server]["file_name"]
+        + config["char_logs"][state.char + "_" + state.server]["file_name"]
     )
-    state = eqa_config.get_last_state(base_path)
 
     # Ensure the character log file exists
     if not os.path.exists(char_log):
@@ -151,10 +157,14 @@ def main():
     read_keys.daemon = True
     read_keys.start()
 
+    ## Compiled config shared by process_parse, process_action and process_sound
+    snapshots = eqa_snapshot.EQA_Snapshots(eqa_action.build_plans)
+    snapshots.publish(config)
+
     ## Process log_q
     ## Produce action_q
     process_parse = threading.Thread(
-        target=eqa_parser.process, args=(exit_flag, log_q, action_q)
+        target=eqa_parser.process, args=(snapshots, exit_flag, log_q, action_q)
     )
     process_parse.daemon = True
     process_parse.start()
@@ -176,6 +186,10 @@ def main():
     process_keys.daemon = True
     process_keys.start()
 
+    ## Batch writes of undetermined lines
+    undetermined = eqa_sink.EQA_Sink(base_path + "log/undetermined.txt")
+    undetermined.start()
+
     ## Consume action_q
     ## Produce display_q, sound_q, system_q
     process_action = threading.Thread(
@@ -187,9 +201,9 @@ def main():
             sound_q,
             exit_flag,
             raid,
-            cfg_reload,
-            config,
+            snapshots,
             base_path,
+            undetermined,
         ),
     )
     process_action.daemon = True
@@ -197,7 +211,7 @@ def main():
 
     ## Consume sound_q
     process_sound = threading.Thread(
-        target=eqa_sound.process, args=(config, sound_q, exit_flag, cfg_reload)
+        target=eqa_sound.process, args=(snapshots, sound_q, exit_flag, base_path)
     )
     process_sound.daemon = True
     process_sound.start()
@@ -228,9 +242,8 @@ def main():
     ## Consume system_q
     try:
         while not exit_flag.is_set():
-            time.sleep(0.001)
-            if not system_q.empty():
-                new_message = system_q.get()
+            new_message = eqa_settings.consume(system_q, exit_flag)
+            if new_message is not None:
                 system_q.task_done()
 
                 if new_message.type == "system":
@@ -312,34 +325,8 @@ def main():
                         config = eqa_config.read_config(base_path)
                         # Reread characters
                         state.set_chars(eqa_config.get_config_chars(config))
-                        # Stop process_action and process_sound
-                        cfg_reload.set()
-                        process_action.join()
-                        process_sound.join()
-                        cfg_reload.clear()
-                        # Start process_action and process_sound
-                        process_action = threading.Thread(
-                            target=eqa_action.process,
-                            args=(
-                                action_q,
-                                system_q,
-                                display_q,
-                                sound_q,
-                                exit_flag,
-                                raid,
-                                cfg_reload,
-                                config,
-                                base_path,
-                            ),
-                        )
-                        process_action.daemon = True
-                        process_action.start()
-                        process_sound = threading.Thread(
-                            target=eqa_sound.process,
-                            args=(config, sound_q, exit_flag, cfg_reload),
-                        )
-                        process_sound.daemon = True
-                        process_sound.start()
+                        # Swap in the new config between messages
+                        snapshots.publish(config)
                         display_q.put(
                             eqa_struct.display(
                                 eqa_settings.eqa_time(),
@@ -366,9 +353,11 @@ def main():
         pass
 
     # Exit
+    exit_flag.set()
     display_q.put(
         eqa_struct.display(eqa_settings.eqa_time(), "event", "events", "Exiting")
     )
+    eqa_settings.wake(keyboard_q, log_q, action_q, sound_q, display_q)
     read_keys.join()
     process_log.join()
     process_parse.join()
@@ -376,6 +365,8 @@ def main():
     process_action.join()
     process_sound.join()
     process_display.join()
+    undetermined.close()
+    eqa_config.flush(base_path)
     eqa_curses.close_screens(screen)
 
 
@@ -18,9 +18,9 @@
    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 """
 
+from collections import namedtuple
 import datetime
 import sys
-import time
 import re
 
 import eqa.lib.config as eqa_config
@@ -29,6 +29,21 @@ import eqa.lib.sound as eqa_sound
 import eqa.lib.struct as eqa_struct
 
 
+# Everything a step may need, rebound when a new snapshot is published
+context = namedtuple(
+    "context",
+    [
+        "system_q",
+        "display_q",
+        "sound_q",
+        "raid",
+        "snapshot",
+        "base_path",
+        "undetermined",
+    ],
+)
+
+
 def process(
     action_q,
     system_q,
@@ -36,247 +51,318 @@ def process(
     sound_q,
     exit_flag,
     raid,
-    cfg_reload,
-    config,
+    snapshots,
     base_path,
+    undetermined,
 ):
     """
     Process: action_q
     Produce: sound_q, display_q, system_q
     """
 
-    try:
-        while not exit_flag.is_set() and not cfg_reload.is_set():
-            time.sleep(0.01)
-            if not action_q.empty():
-                new_message = action_q.get()
-                action_q.task_done()
-                line_type = new_message.type
-                line_time = new_message.timestamp
-                line_tx = new_message.tx
-                line_rx = new_message.rx
-                check_line = new_message.payload
-
-                # Line specific checks
-                if line_type == "undetermined":
-                    undetermined_line(check_line, base_path)
-                elif line_type == "location":
-                    y, x, z = re.findall("[-]?(?:\d*\.)?\d+", check_line)
-                    loc = [y, x, z]
-                    system_q.put(
-                        eqa_struct.message(
-                            eqa_settings.eqa_time(), "system", "loc", "null", loc
-                        )
-                    )
-                elif line_type == "direction":
-                    direction = re.findall(
-                        "(?:North(?:East|West)?|South(?:East|West)?|(?:Ea|We)st)",
-                        check_line,
-                    )
-                    system_q.put(
-                        eqa_struct.message(
-                            eqa_settings.eqa_time(),
-                            "system",
-                            "direction",
-                            "null",
-                            direction[0],
-                        )
-                    )
-                elif line_type.startswith("you_afk"):
-                    if line_type == "you_afk_on":
-                        display_q.put(
-                            eqa_struct.display(
-                                eqa_settings.eqa_time(),
-                                "event",
-                                "events",
-                                "You are now AFK",
-                            )
-                        )
-                        system_q.put(
-                            eqa_struct.message(
-                                eqa_settings.eqa_time(), "system", "afk", "null", "true"
-                            )
-                        )
-                    elif line_type == "you_afk_off":
-                        display_q.put(
-                            eqa_struct.display(
-                                eqa_settings.eqa_time(),
-                                "event",
-                                "events",
-                                "You are no longer AFK",
-                            )
-                        )
-                        system_q.put(
-                            eqa_struct.message(
-                                eqa_settings.eqa_time(),
-                                "system",
-                                "afk",
-                                "null",
-                                "false",
-                            )
-                        )
-                elif line_type == "you_new_zone":
-                    current_zone = re.findall(
-                        "(?<=You have entered )[a-zA-Z\s]+", check_line
-                    )
-                    sound_q.put(eqa_struct.sound("speak", current_zone[0]))
-                    display_q.put(
-                        eqa_struct.display(
-                            eqa_settings.eqa_time(), "update", "zone", current_zone[0]
-                        )
-                    )
-                    system_q.put(
-                        eqa_struct.message(
-                            eqa_settings.eqa_time(),
-                            "system",
-                            "zone",
-                            "null",
-                            current_zone[0],
-                        )
-                    )
-                    if current_zone[0] not in config["zones"].keys():
-                        eqa_config.add_zone(current_zone[0], base_path)
-                    elif (
-                        current_zone[0] in config["zones"].keys() and not raid.is_set()
-                    ):
-                        if config["zones"][current_zone[0]] == "raid":
-                            raid.set()
-                            display_q.put(
-                                eqa_struct.display(
-                                    eqa_settings.eqa_time(),
-                                    "event",
-                                    "events",
-                                    "Raid mode auto-enabled",
-                                )
-                            )
-                            sound_q.put(eqa_struct.sound("speak", "Raid mode enabled"))
-                    elif current_zone[0] in config["zones"].keys() and raid.is_set():
-                        if config["zones"][current_zone[0]] != "raid":
-                            raid.clear()
-                            display_q.put(
-                                eqa_struct.display(
-                                    eqa_settings.eqa_time(),
-                                    "event",
-                                    "events",
-                                    "Raid mode auto-disabled",
-                                )
-                            )
-                            sound_q.put(eqa_struct.sound("speak", "Raid mode disabled"))
-
-                # If line_type is a parsable type
-                if line_type in config["line"].keys():
-                    # If line_type is parsed for as true
-                    if config["line"][line_type]["reaction"] == "true":
-                        for keyphrase, value in config["line"][line_type][
-                            "alert"
-                        ].items():
-                            if (
-                                str(keyphrase).lower() in check_line.lower()
-                                and value == "true"
-                            ):
-                                sound_q.put(eqa_struct.sound("alert", line_type))
-                                display_q.put(
-                                    eqa_struct.display(
-                                        eqa_settings.eqa_time(),
-                                        "event",
-                                        "events",
-                                        line_type + ": " + check_line,
-                                    )
-                                )
-                            elif (
-                                str(keyphrase).lower() in check_line.lower()
-                                and value == "raid"
-                                and raid.is_set()
-                            ):
-                                if keyphrase == "assist" or keyphrase == "rampage":
-                                    target = re.findall("^([\w\-]+)", check_line)
-                                    payload = keyphrase + " on " + target[0]
-                                else:
-                                    payload = keyphrase
-                                sound_q.put(eqa_struct.sound("speak", payload))
-                                display_q.put(
-                                    eqa_struct.display(
-                                        eqa_settings.eqa_time(),
-                                        "event",
-                                        "events",
-                                        line_type + ": " + check_line,
-                                    )
-                                )
-
-                    # Or if line_type is parsed for as all
-                    elif config["line"][line_type]["reaction"] == "all":
-
-                        # Notify on all 'all' alerts
-                        sound_q.put(eqa_struct.sound("alert", line_type))
-                        display_q.put(
-                            eqa_struct.display(
-                                eqa_settings.eqa_time(),
-                                "event",
-                                "events",
-                                line_type + ": " + check_line,
-                            )
-                        )
-
-                    # Or if line_type is parsed for as a spoken alert
-                    elif config["line"][line_type]["reaction"] == "speak":
-                        display_q.put(
-                            eqa_struct.display(
-                                eqa_settings.eqa_time(), "event", "events", check_line
-                            )
-                        )
-                        sound_q.put(eqa_struct.sound("speak", check_line))
-
-                    # For triggers requiring all line_types
-                    if config["line"]["all"]["reaction"] == "true":
-                        for keyphrase, value in config["alert"]["all"].items():
-                            if keyphrase in check_line.lower():
-                                sound_q.put(eqa_struct.sound("alert", line_type))
-                                display_q.put(
-                                    eqa_struct.display(
-                                        eqa_settings.eqa_time(),
-                                        "event",
-                                        "events",
-                                        line_type + ": " + check_line,
-                                    )
-                                )
-
-                # If line_type is not a parsable type
-                else:
-                    eqa_config.add_type(line_type, base_path)
-                    display_q.put(
-                        eqa_struct.display(
-                            eqa_settings.eqa_time(),
-                            "event",
-                            "events",
-                            "added: " + line_type,
-                        )
-                    )
-                    system_q.put(
-                        eqa_struct.message(
-                            eqa_settings.eqa_time(),
-                            "system",
-                            "reload_config",
-                            "null",
-                            "null",
-                        )
-                    )
-
-    except Exception as e:
-        eqa_settings.log(
-            "process action: Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
+    ctx = context(
+        system_q,
+        display_q,
+        sound_q,
+        raid,
+        snapshots.current,
+        base_path,
+        undetermined,
+    )
+
+    while not exit_flag.is_set():
+        new_message = eqa_settings.consume(action_q, exit_flag)
+        if new_message is not None:
+            try:
+                # Pick up a reloaded config between messages
+                if snapshots.current is not ctx.snapshot:
+                    ctx = ctx._replace(snapshot=snapshots.current)
+
+                handle(new_message, ctx)
+
+            except Exception as e:
+                eqa_settings.log(
+                    "process action: Error on line "
+                    + str(sys.exc_info()[-1].tb_lineno)
+                    + ": "
+                    + str(e)
+                )
+            # Done only once everything it produced is queued
+            action_q.task_done()
 
     sys.exit(0)
 
 
-def undetermined_line(line, base_path):
-    """Temp function to log undetermined log lines"""
-    f = open(base_path + "log/undetermined.txt", "a")
-    f.write(line + "\n")
-    f.close()
+def handle(new_message, ctx):
+    """Run the steps planned for a message's line type"""
+
+    line_type = new_message.type
+    check_line = new_message.payload
+    fields = new_message.fields or {}
+
+    plan = ctx.snapshot.plans.get(line_type)
+    if plan is None:
+        plan = missing_plan(line_type)
+    for step in plan:
+        step(line_type, check_line, fields, ctx)
+
+
+def build_plans(config, alerts):
+    """Map each configured line type to the steps run for it"""
+
+    plans = {}
+    for line_type, settings in config["line"].items():
+        plan = []
+        if line_type in HANDLERS:
+            plan.append(HANDLERS[line_type])
+        if settings["reaction"] == "true" and line_type in alerts:
+            plan.append(react_keyphrase)
+        elif settings["reaction"] == "all":
+            plan.append(react_all)
+        elif settings["reaction"] == "speak":
+            plan.append(react_speak)
+        if config["line"]["all"]["reaction"] == "true" and "all" in alerts:
+            plan.append(react_any_keyphrase)
+        plans[line_type] = tuple(plan)
+
+    return plans
+
+
+def missing_plan(line_type):
+    """Steps for a line type not yet in the config"""
+
+    if line_type in HANDLERS:
+        return (HANDLERS[line_type], add_line_type)
+
+    return (add_line_type,)
+
+
+def register(line_type, handler):
+    """Run handler(line_type, check_line, fields, ctx) for every line_type line"""
+
+    HANDLERS[line_type] = handler
+
+
+def action_undetermined(line_type, check_line, fields, ctx):
+    """Record a line no rule matched"""
+
+    ctx.undetermined.add(check_line)
+
+
+def action_location(line_type, check_line, fields, ctx):
+    """Update location state"""
+
+    loc = [fields["y"], fields["x"], fields["z"]]
+    ctx.system_q.put(
+        eqa_struct.message(eqa_settings.eqa_time(), "system", "loc", "null", loc)
+    )
+
+
+def action_direction(line_type, check_line, fields, ctx):
+    """Update direction state"""
+
+    ctx.system_q.put(
+        eqa_struct.message(
+            eqa_settings.eqa_time(),
+            "system",
+            "direction",
+            "null",
+            fields["direction"],
+        )
+    )
+
+
+def action_you_afk_on(line_type, check_line, fields, ctx):
+    """Update afk state"""
+
+    ctx.display_q.put(
+        eqa_struct.display(
+            eqa_settings.eqa_time(),
+            "event",
+            "events",
+            "You are now AFK",
+        )
+    )
+    ctx.system_q.put(
+        eqa_struct.message(eqa_settings.eqa_time(), "system", "afk", "null", "true")
+    )
+
+
+def action_you_afk_off(line_type, check_line, fields, ctx):
+    """Update afk state"""
+
+    ctx.display_q.put(
+        eqa_struct.display(
+            eqa_settings.eqa_time(),
+            "event",
+            "events",
+            "You are no longer AFK",
+        )
+    )
+    ctx.system_q.put(
+        eqa_struct.message(
+            eqa_settings.eqa_time(),
+            "system",
+            "afk",
+            "null",
+            "false",
+        )
+    )
+
+
+def action_you_new_zone(line_type, check_line, fields, ctx):
+    """Update zone state and toggle raid mode for raid zones"""
+
+    zone = fields["zone"]
+    ctx.sound_q.put(eqa_struct.sound("speak", zone))
+    ctx.display_q.put(
+        eqa_struct.display(eqa_settings.eqa_time(), "update", "zone", zone)
+    )
+    ctx.system_q.put(
+        eqa_struct.message(
+            eqa_settings.eqa_time(),
+            "system",
+            "zone",
+            "null",
+            zone,
+        )
+    )
+    if zone not in ctx.snapshot.zones.keys():
+        eqa_config.add_zone(zone, ctx.base_path)
+    elif not ctx.raid.is_set():
+        if ctx.snapshot.zones[zone] == "raid":
+            ctx.raid.set()
+            ctx.display_q.put(
+                eqa_struct.display(
+                    eqa_settings.eqa_time(),
+                    "event",
+                    "events",
+                    "Raid mode auto-enabled",
+                )
+            )
+            ctx.sound_q.put(
+                eqa_struct.sound("speak", "Raid mode enabled", eqa_sound.PRIORITY_RAID)
+            )
+    else:
+        if ctx.snapshot.zones[zone] != "raid":
+            ctx.raid.clear()
+            ctx.display_q.put(
+                eqa_struct.display(
+                    eqa_settings.eqa_time(),
+                    "event",
+                    "events",
+                    "Raid mode auto-disabled",
+                )
+            )
+            ctx.sound_q.put(
+                eqa_struct.sound("speak", "Raid mode disabled", eqa_sound.PRIORITY_RAID)
+            )
+
+
+def react_keyphrase(line_type, check_line, fields, ctx):
+    """Alert on keyphrases set for this line type"""
+
+    for keyphrase, value in ctx.snapshot.alerts[line_type].match(check_line):
+        if value == "true":
+            ctx.sound_q.put(eqa_struct.sound("alert", line_type))
+            ctx.display_q.put(
+                eqa_struct.display(
+                    eqa_settings.eqa_time(),
+                    "event",
+                    "events",
+                    line_type + ": " + check_line,
+                )
+            )
+        elif value == "raid" and ctx.raid.is_set():
+            if keyphrase == "assist" or keyphrase == "rampage":
+                target = fields.get("speaker") or fields.get("source")
+                if target is None:
+                    target = re.findall("^([\w\-]+)", check_line)[0]
+                payload = keyphrase + " on " + target
+            else:
+                payload = keyphrase
+            ctx.sound_q.put(eqa_struct.sound("speak", payload, eqa_sound.PRIORITY_RAID))
+            ctx.display_q.put(
+                eqa_struct.display(
+                    eqa_settings.eqa_time(),
+                    "event",
+                    "events",
+                    line_type + ": " + check_line,
+                )
+            )
+
+
+def react_all(line_type, check_line, fields, ctx):
+    """Alert on every line of this line type"""
+
+    ctx.sound_q.put(eqa_struct.sound("alert", line_type))
+    ctx.display_q.put(
+        eqa_struct.display(
+            eqa_settings.eqa_time(),
+            "event",
+            "events",
+            line_type + ": " + check_line,
+        )
+    )
+
+
+def react_speak(line_type, check_line, fields, ctx):
+    """Speak every line of this line type"""
+
+    ctx.display_q.put(
+        eqa_struct.display(eqa_settings.eqa_time(), "event", "events", check_line)
+    )
+    ctx.sound_q.put(eqa_struct.sound("speak", check_line))
+
+
+def react_any_keyphrase(line_type, check_line, fields, ctx):
+    """Alert on keyphrases set for all line types"""
+
+    for keyphrase, value in ctx.snapshot.alerts["all"].match(check_line):
+        if value == "true":
+            ctx.sound_q.put(eqa_struct.sound("alert", line_type))
+            ctx.display_q.put(
+                eqa_struct.display(
+                    eqa_settings.eqa_time(),
+                    "event",
+                    "events",
+                    line_type + ": " + check_line,
+                )
+            )
+
+
+def add_line_type(line_type, check_line, fields, ctx):
+    """Add a new line type to the config and reload"""
+
+    eqa_config.add_type(line_type, ctx.base_path)
+    ctx.display_q.put(
+        eqa_struct.display(
+            eqa_settings.eqa_time(),
+            "event",
+            "events",
+            "added: " + line_type,
+        )
+    )
+    ctx.system_q.put(
+        eqa_struct.message(
+            eqa_settings.eqa_time(),
+            "system",
+            "reload_config",
+            "null",
+            "null",
+        )
+    )
+
+
+# Built-in handlers run ahead of any configured reaction
+HANDLERS = {
+    "undetermined": action_undetermined,
+    "location": action_location,
+    "direction": action_direction,
+    "you_afk_on": action_you_afk_on,
+    "you_afk_off": action_you_afk_off,
+    "you_new_zone": action_you_new_zone,
+}
 
 
 if __name__ == "__main__":
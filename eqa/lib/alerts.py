@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/lib/alerts.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+class EQA_Keyphrases:
+    """Find every alert keyphrase in a line with one scan"""
+
+    def __init__(self, alerts):
+        """
+        Build an Aho-Corasick automaton over the lowercased keyphrases of one
+        alert dictionary. Failure links are folded into the transition table
+        up front, so a scan is one dict lookup per character of the line.
+        """
+        self.phrases = [(keyphrase, value) for keyphrase, value in alerts.items()]
+
+        # Trie of lowercased keyphrases
+        self.delta = [{}]
+        self.output = [set()]
+        for phrase_id, (keyphrase, value) in enumerate(self.phrases):
+            node = 0
+            for char in str(keyphrase).lower():
+                if char not in self.delta[node]:
+                    self.delta.append({})
+                    self.output.append(set())
+                    self.delta[node][char] = len(self.delta) - 1
+                node = self.delta[node][char]
+            self.output[node].add(phrase_id)
+
+        # Breadth first, resolve failure links into full transitions
+        fail = [0] * len(self.delta)
+        queue = list(self.delta[0].values())
+        for node in queue:
+            self.output[node] |= self.output[fail[node]]
+            for char, child in self.delta[node].items():
+                fail_node = fail[node]
+                while fail_node and char not in self.delta[fail_node]:
+                    fail_node = fail[fail_node]
+                fail[child] = self.delta[fail_node].get(char, 0)
+                if fail[child] == child:
+                    fail[child] = 0
+                queue.append(child)
+            for char, target in self.delta[fail[node]].items():
+                if char not in self.delta[node] and target:
+                    self.delta[node][char] = target
+
+        self.output = [tuple(sorted(ids)) for ids in self.output]
+
+    def match(self, line):
+        """Return (keyphrase, value) for every keyphrase in line, config order"""
+        found = set(self.output[0])
+        delta = self.delta
+        output = self.output
+        node = 0
+        for char in line.lower():
+            node = delta[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+
+        return [self.phrases[phrase_id] for phrase_id in sorted(found)]
+
+
+def build(config):
+    """Compile a keyphrase matcher for every line type with alerts"""
+    matchers = {}
+    for line_type, settings in config["line"].items():
+        alerts = settings.get("alert")
+        if alerts:
+            matchers[line_type] = EQA_Keyphrases(alerts)
+
+    return matchers
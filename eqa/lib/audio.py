@@ -0,0 +1,296 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/lib/audio.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+from collections import namedtuple
+from collections import OrderedDict
+import shutil
+import subprocess
+import threading
+import time
+import wave
+
+import eqa.lib.settings as eqa_settings
+
+
+# Default bound on decoded sounds kept in memory
+PCM_CACHE_MB = 32
+
+# Sink used when the config does not name one
+SINK = "device"
+
+# Output buffer the players are asked for, and silence padded after each
+# sound so a clip shorter than the buffer still starts and drains
+LATENCY_MS = 50
+
+# Raw PCM format names by sample width, for pacat and aplay
+PACAT_FORMATS = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}
+APLAY_FORMATS = {1: "U8", 2: "S16_LE", 3: "S24_3LE", 4: "S32_LE"}
+
+# Decoded sound, frames is raw little endian PCM
+pcm = namedtuple("pcm", ["rate", "channels", "width", "frames"])
+
+
+def decode(path):
+    """Return the PCM of a WAV file, or None for anything else"""
+    try:
+        wav_file = wave.open(path, "rb")
+        try:
+            return pcm(
+                wav_file.getframerate(),
+                wav_file.getnchannels(),
+                wav_file.getsampwidth(),
+                wav_file.readframes(wav_file.getnframes()),
+            )
+        finally:
+            wav_file.close()
+    except (EOFError, OSError, wave.Error):
+        # Not PCM WAV, gTTS writes MP3 whatever the extension
+        return None
+
+
+def silence(sound, milliseconds):
+    """Raw PCM silence in the format of sound"""
+    frame = sound.channels * sound.width
+    frames = sound.rate * milliseconds // 1000
+    # Unsigned 8 bit PCM is silent at its midpoint
+    byte = b"\x80" if sound.width == 1 else b"\x00"
+
+    return byte * (frames * frame)
+
+
+def duration(sound):
+    """Seconds sound plays for"""
+    return len(sound.frames) / (sound.rate * sound.channels * sound.width)
+
+
+class EQA_PCM_Cache:
+    """Decoded sounds by path, least recently used dropped first"""
+
+    def __init__(self, max_bytes=PCM_CACHE_MB * 1048576):
+        """Start empty"""
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.sounds = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        """Return the PCM of path, decoding it on first use, or None"""
+        with self.lock:
+            if path in self.sounds:
+                self.hits += 1
+                self.sounds.move_to_end(path)
+                return self.sounds[path]
+            self.misses += 1
+
+        # Undecodable files are not remembered, they would never be evicted
+        sound = decode(path)
+        if sound is None:
+            return None
+        with self.lock:
+            if path not in self.sounds:
+                self.sounds[path] = sound
+                self.total += len(sound.frames)
+            while self.total > self.max_bytes and len(self.sounds) > 1:
+                self.total -= len(self.sounds.popitem(last=False)[1].frames)
+
+        return sound
+
+    def clear(self):
+        """Forget every decoded sound"""
+        with self.lock:
+            self.sounds.clear()
+            self.total = 0
+
+    def report(self):
+        """Summarize the counters for the log"""
+        with self.lock:
+            return (
+                "pcm cache "
+                + str(self.hits)
+                + " hits "
+                + str(self.misses)
+                + " misses, "
+                + str(len(self.sounds))
+                + " sounds in "
+                + "{:.1f}".format(self.total / 1048576)
+                + "MB"
+            )
+
+
+def exited(player):
+    """Raise if a player process has stopped"""
+    if player.poll() is not None:
+        raise OSError("player exited with " + str(player.returncode))
+
+
+class EQA_Device_Sink:
+    """
+    Stream PCM to long lived pacat or aplay processes, one per sound
+    playing at once and format, instead of starting a player per alert
+    """
+
+    name = "device"
+
+    def __init__(self):
+        """Find a raw PCM player on PATH"""
+        self.pacat = shutil.which("pacat")
+        self.aplay = shutil.which("aplay")
+        self.lock = threading.Lock()
+        self.idle = {}
+
+    def available(self):
+        """Whether pacat or aplay is installed"""
+        return self.pacat is not None or self.aplay is not None
+
+    def command(self, sound):
+        """Player command reading raw PCM in the format of sound on stdin"""
+        if self.pacat is not None:
+            return [
+                self.pacat,
+                "--raw",
+                "--format=" + PACAT_FORMATS[sound.width],
+                "--rate=" + str(sound.rate),
+                "--channels=" + str(sound.channels),
+                "--latency-msec=" + str(LATENCY_MS),
+            ]
+
+        return [
+            self.aplay,
+            "-q",
+            "-t",
+            "raw",
+            "-f",
+            APLAY_FORMATS[sound.width],
+            "-r",
+            str(sound.rate),
+            "-c",
+            str(sound.channels),
+            "--buffer-time=" + str(LATENCY_MS * 1000),
+            "--start-delay=0",
+            "-",
+        ]
+
+    def play(self, sound):
+        """Block until sound has about finished playing"""
+        audio_format = (sound.rate, sound.channels, sound.width)
+        with self.lock:
+            streams = self.idle.setdefault(audio_format, [])
+            player = None
+            while streams and player is None:
+                player = streams.pop()
+                if player.poll() is not None:
+                    player = None
+        if player is None:
+            player = subprocess.Popen(
+                self.command(sound),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+
+        started = time.monotonic()
+        try:
+            player.stdin.write(sound.frames + silence(sound, LATENCY_MS))
+            player.stdin.flush()
+        except (BrokenPipeError, OSError):
+            player.kill()
+            raise
+        # A player that could not open the device exits, let the caller
+        # fall back instead of sleeping through a sound nobody hears
+        exited(player)
+        # Writes return once the pipe takes the tail, wait out the playback
+        time.sleep(max(started + duration(sound) - time.monotonic(), 0))
+        # A new player may only give up once it has read the sound
+        exited(player)
+
+        with self.lock:
+            self.idle.setdefault(audio_format, []).append(player)
+
+    def close(self):
+        """Stop every player"""
+        with self.lock:
+            for streams in self.idle.values():
+                for player in streams:
+                    try:
+                        player.stdin.close()
+                    except OSError:
+                        pass
+                    player.terminate()
+            self.idle = {}
+
+
+class EQA_Null_Sink:
+    """Play nothing, counting what would have played"""
+
+    name = "null"
+
+    def __init__(self):
+        """Start empty"""
+        self.lock = threading.Lock()
+        self.played = 0
+        self.seconds = 0.0
+
+    def available(self):
+        """Always"""
+        return True
+
+    def play(self, sound):
+        """Count sound"""
+        with self.lock:
+            self.played += 1
+            self.seconds += duration(sound)
+
+    def close(self):
+        """Log what would have played"""
+        with self.lock:
+            eqa_settings.log(
+                "null sink: "
+                + str(self.played)
+                + " sounds, "
+                + "{:.1f}".format(self.seconds)
+                + "s would have played"
+            )
+
+
+def sink_name(config):
+    """Name of the configured sink"""
+    return config["settings"].get("audio", {}).get("sink", SINK)
+
+
+def select_sink(config):
+    """
+    The configured sink, or None to hand files to playsound. A device
+    sink without pacat or aplay installed also means playsound.
+    """
+    name = sink_name(config)
+    if name == "null":
+        return EQA_Null_Sink()
+    if name == "playsound":
+        return None
+    if name != "device":
+        eqa_settings.log("audio: Unknown sink " + name + ", using device")
+    sink = EQA_Device_Sink()
+    if not sink.available():
+        eqa_settings.log("audio: pacat and aplay not found, using playsound")
+        return None
+
+    return sink
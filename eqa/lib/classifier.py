@@ -0,0 +1,455 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/lib/classifier.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+from collections import OrderedDict
+import heapq
+import re
+
+try:
+    import re._parser as sre_parse
+except ImportError:
+    import sre_parse
+
+
+# Compiled candidate alternations kept before the cache is reset
+MAX_ALTERNATIONS = 512
+
+# Lines classified between reordering rules by hit count
+REORDER_INTERVAL = 5000
+
+# Digit runs masked out of cache keys
+DIGITS = re.compile(r"\d+")
+
+# Named groups, dropped from alternations where names would collide
+NAMED_GROUP = re.compile(r"\(\?P<\w+>")
+
+
+class EQA_Classifier:
+    """Classify log lines against an ordered pattern table"""
+
+    def __init__(self, families):
+        """
+        Index every rule by a token or literal it cannot match without, then
+        compile the rules left standing for a line into one alternation of
+        named groups. Alternatives are tried in table order and fullmatch
+        backtracks into the next one on failure, so the first matching rule
+        still wins. Rules may name groups to capture fields, those are only
+        compiled on their own and run against lines the rule already won.
+        """
+        self.rules = []
+        self.fields = []
+        rule_tokens = []
+        for family, rules in families:
+            for line_type, pattern in rules:
+                compiled = re.compile(pattern)
+                self.fields.append(compiled if compiled.groupindex else None)
+                pattern = NAMED_GROUP.sub("(?:", pattern)
+                self.rules.append((family, line_type, pattern))
+                rule_tokens.append(required_tokens(pattern))
+
+        # Prefer the token shared by the fewest rules
+        token_count = {}
+        for tokens in rule_tokens:
+            for token in set(tokens):
+                token_count[token] = token_count.get(token, 0) + 1
+
+        self.tokens = {}
+        keywords = {}
+        self.unindexed = set()
+        for rule_id, tokens in enumerate(rule_tokens):
+            if tokens:
+                token = min(tokens, key=lambda token: token_count[token])
+                self.tokens.setdefault(token, set()).add(rule_id)
+                continue
+            keyword = required_literal(self.rules[rule_id][2])
+            if keyword:
+                keywords.setdefault(keyword, set()).add(rule_id)
+            else:
+                self.unindexed.add(rule_id)
+        self.keywords = list(keywords.items())
+        self.alternations = {}
+
+        # Rules that might match the same line keep their table order
+        ends = [literal_ends(rule[2]) for rule in self.rules]
+        self.successors = [[] for rule in self.rules]
+        self.predecessors = [0 for rule in self.rules]
+        for first in range(len(self.rules)):
+            for second in range(first + 1, len(self.rules)):
+                if may_overlap(
+                    ends[first],
+                    self.rules[first][2],
+                    ends[second],
+                    self.rules[second][2],
+                ):
+                    self.successors[first].append(second)
+                    self.predecessors[second] += 1
+
+        # Live counters
+        self.hits = [0 for rule in self.rules]
+        self.undetermined = 0
+        self.classified = 0
+        self.reorders = 0
+        self.rank = list(range(len(self.rules)))
+
+        # Optional line skeleton cache, disabled until sized
+        self.numbers = set()
+        for rule in self.rules:
+            self.numbers |= literal_numbers(rule[2])
+        self.cache = OrderedDict()
+        self.cache_size = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+
+    def candidates(self, line):
+        """Return ids of the rules indexed under line, in table order"""
+        candidates = set(self.unindexed)
+        for token in line.split():
+            rule_ids = self.tokens.get(token)
+            if rule_ids is not None:
+                candidates |= rule_ids
+        for keyword, rule_ids in self.keywords:
+            if keyword in line:
+                candidates |= rule_ids
+        return tuple(sorted(candidates))
+
+    def alternation(self, rule_ids):
+        """
+        Return the compiled alternation for a set of rules in current order.
+        After a reorder it is only recompiled if these rules moved.
+        """
+        cached = self.alternations.get(rule_ids)
+        if cached is not None and cached[0] == self.reorders:
+            return cached[2]
+
+        ordered = tuple(sorted(rule_ids, key=self.rank.__getitem__))
+        if cached is not None and cached[1] == ordered:
+            pattern = cached[2]
+        else:
+            if len(self.alternations) >= MAX_ALTERNATIONS:
+                self.alternations.clear()
+            pattern = re.compile(
+                "|".join(
+                    "(?P<r" + str(rule_id) + ">" + self.rules[rule_id][2] + ")"
+                    for rule_id in ordered
+                )
+            )
+        self.alternations[rule_ids] = (self.reorders, ordered, pattern)
+        return pattern
+
+    def match(self, line):
+        """Return the id of the first rule matching line, or -1"""
+        rule_ids = self.candidates(line)
+        if not rule_ids:
+            return -1
+        match = self.alternation(rule_ids).fullmatch(line)
+        if match is None:
+            return -1
+        return int(match.lastgroup[1:])
+
+    def identify(self, line):
+        """Return the id of the rule line belongs to, or -1, and count it"""
+        self.classified += 1
+        if self.classified % REORDER_INTERVAL == 0:
+            self.reorder()
+
+        if self.cache_size:
+            key = self.skeleton(line)
+            rule_id = self.cache.get(key)
+            if rule_id is None:
+                self.cache_misses += 1
+                rule_id = self.match(line)
+                self.cache[key] = rule_id
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+                    self.cache_evictions += 1
+            else:
+                self.cache_hits += 1
+                self.cache.move_to_end(key)
+        else:
+            rule_id = self.match(line)
+
+        if rule_id < 0:
+            self.undetermined += 1
+        else:
+            self.hits[rule_id] += 1
+        return rule_id
+
+    def classify(self, line):
+        """Return the line type of the first matching rule"""
+        rule_id = self.identify(line)
+        if rule_id < 0:
+            return "undetermined"
+        return self.rules[rule_id][1]
+
+    def extract(self, line):
+        """Return the line type and the fields its rule captures from line"""
+        rule_id = self.identify(line)
+        if rule_id < 0:
+            return "undetermined", {}
+        fields = self.fields[rule_id]
+        if fields is None:
+            return self.rules[rule_id][1], {}
+        return self.rules[rule_id][1], fields.fullmatch(line).groupdict()
+
+    def skeleton(self, line):
+        """
+        Return line with every digit masked to 0, unless a rule spells that
+        number out. Rules otherwise only match digits with classes that take
+        any digit, so every line sharing a skeleton gets the same line type.
+        """
+        return DIGITS.sub(self.mask_number, line)
+
+    def mask_number(self, match):
+        """Mask a digit run for skeleton"""
+        number = match.group()
+        if number in self.numbers:
+            return number
+        return "0" * len(number)
+
+    def set_cache_size(self, size):
+        """Bound the skeleton cache, 0 disables it"""
+        self.cache_size = max(int(size), 0)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+            self.cache_evictions += 1
+
+    def reorder(self):
+        """
+        Try the most frequent rules first. Rules are placed by descending hit
+        count, ties in table order, but never ahead of an earlier rule they
+        may overlap with, so every line still gets the same line type.
+        """
+        waiting = list(self.predecessors)
+        ready = [
+            (-self.hits[rule_id], rule_id)
+            for rule_id in range(len(self.rules))
+            if not waiting[rule_id]
+        ]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            hits, rule_id = heapq.heappop(ready)
+            order.append(rule_id)
+            for successor in self.successors[rule_id]:
+                waiting[successor] -= 1
+                if not waiting[successor]:
+                    heapq.heappush(ready, (-self.hits[successor], successor))
+
+        for position, rule_id in enumerate(order):
+            self.rank[rule_id] = position
+        self.reorders += 1
+
+    def counts(self):
+        """Return hits per line type, most frequent first"""
+        counts = {"undetermined": self.undetermined}
+        for rule_id, rule in enumerate(self.rules):
+            if self.hits[rule_id]:
+                counts[rule[1]] = self.hits[rule_id]
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def report(self, top=10):
+        """Summarize the live counters for the log"""
+        counts = self.counts()
+        return (
+            "classified "
+            + str(self.classified)
+            + " lines, "
+            + str(self.reorders)
+            + " reorders, cache "
+            + str(self.cache_hits)
+            + " hits "
+            + str(self.cache_misses)
+            + " misses "
+            + str(self.cache_evictions)
+            + " evictions, top types: "
+            + ", ".join(
+                line_type + "=" + str(count)
+                for line_type, count in list(counts.items())[:top]
+            )
+        )
+
+
+def required_tokens(pattern):
+    """
+    Return the whitespace delimited words spelled out at the top level of
+    pattern. Each is bounded by a literal space or an end of the pattern, so
+    any line the pattern fullmatches has it as a whole token in line.split().
+    """
+    parsed = sre_parse.parse(pattern)
+    if parsed.state.flags & re.IGNORECASE:
+        return []
+    items = list(parsed)
+
+    # Anchors are zero width, skip them at either end
+    start = 0
+    while start < len(items) and items[start][0] == sre_parse.AT:
+        start += 1
+    end = len(items)
+    while end > start and items[end - 1][0] == sre_parse.AT:
+        end -= 1
+
+    tokens = []
+    index = start
+    while index < end:
+        if items[index][0] != sre_parse.LITERAL:
+            index += 1
+            continue
+        run_start = index
+        run = ""
+        while index < end and items[index][0] == sre_parse.LITERAL:
+            run += chr(items[index][1])
+            index += 1
+        words = run.split(" ")
+        for position, word in enumerate(words):
+            if not word:
+                continue
+            if position == 0 and run_start != start:
+                continue
+            if position == len(words) - 1 and index != end:
+                continue
+            tokens.append(word)
+
+    return tokens
+
+
+def required_literal(pattern):
+    """
+    Return the longest run of literal characters found at the top level of
+    pattern, which any line it fullmatches must contain. Returns an empty
+    string when the pattern has no such run.
+    """
+    parsed = sre_parse.parse(pattern)
+    if parsed.state.flags & re.IGNORECASE:
+        return ""
+
+    longest = ""
+    run = ""
+    for op, av in parsed:
+        if op == sre_parse.LITERAL:
+            run += chr(av)
+            if len(run) > len(longest):
+                longest = run
+        else:
+            run = ""
+
+    return longest
+
+
+def literal_numbers(pattern):
+    """Return every run of literal digits spelled out anywhere in pattern"""
+    numbers = set()
+    sequences = [sre_parse.parse(pattern)]
+    while sequences:
+        number = ""
+        for op, av in sequences.pop():
+            if op == sre_parse.LITERAL and chr(av).isdigit():
+                number += chr(av)
+                continue
+            if number:
+                numbers.add(number)
+                number = ""
+            if op == sre_parse.BRANCH:
+                sequences.extend(av[1])
+            elif op == sre_parse.SUBPATTERN:
+                sequences.append(av[-1])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                sequences.append(av[2])
+        if number:
+            numbers.add(number)
+
+    return numbers
+
+
+def literal_ends(pattern):
+    """
+    Return (prefix, suffix, exact) for each top level alternative of pattern,
+    where prefix and suffix are its leading and trailing literal text and
+    exact is the whole alternative when it is nothing but literal text.
+    """
+    parsed = sre_parse.parse(pattern)
+    if parsed.state.flags & re.IGNORECASE:
+        return [("", "", None)]
+    return alternative_ends(list(parsed))
+
+
+def alternative_ends(items):
+    """Return literal_ends for a parsed sequence of items"""
+    start = 0
+    while start < len(items) and items[start][0] == sre_parse.AT:
+        start += 1
+    end = len(items)
+    while end > start and items[end - 1][0] == sre_parse.AT:
+        end -= 1
+    items = items[start:end]
+
+    # A lone group holding a branch, ^(this|that)
+    if len(items) == 1 and items[0][0] == sre_parse.SUBPATTERN:
+        group = list(items[0][1][-1])
+        if len(group) == 1 and group[0][0] == sre_parse.BRANCH:
+            ends = []
+            for branch in group[0][1][1]:
+                ends.extend(alternative_ends(list(branch)))
+            return ends
+
+    prefix = ""
+    for op, av in items:
+        if op != sre_parse.LITERAL:
+            break
+        prefix += chr(av)
+    suffix = ""
+    for op, av in reversed(items):
+        if op != sre_parse.LITERAL:
+            break
+        suffix = chr(av) + suffix
+    exact = prefix if len(prefix) == len(items) else None
+
+    return [(prefix, suffix, exact)]
+
+
+def may_overlap(first_ends, first_pattern, second_ends, second_pattern):
+    """
+    Return False only when no line can fullmatch both patterns, either
+    because their literal prefixes or suffixes disagree or because one is
+    plain text the other does not match.
+    """
+    for first_prefix, first_suffix, first_exact in first_ends:
+        for second_prefix, second_suffix, second_exact in second_ends:
+            if not (
+                first_prefix.startswith(second_prefix)
+                or second_prefix.startswith(first_prefix)
+            ):
+                continue
+            if not (
+                first_suffix.endswith(second_suffix)
+                or second_suffix.endswith(first_suffix)
+            ):
+                continue
+            if first_exact is not None and not re.fullmatch(
+                second_pattern, first_exact
+            ):
+                continue
+            if second_exact is not None and not re.fullmatch(
+                first_pattern, second_exact
+            ):
+                continue
+            return True
+
+    return False
@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/lib/cluster.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+   Group undetermined lines into templates to find rules worth adding
+
+   python -m eqa.lib.cluster ~/.eqa/log/undetermined.txt
+   python -m eqa.lib.cluster path/to/eqlog_Char_server.txt
+"""
+
+import argparse
+import re
+
+
+# Placeholders, in the order they are masked
+QUOTED = re.compile(r"'[^']*'")
+NUMBER = re.compile(r"\d+")
+NAME = re.compile(r"\b[A-Z][a-z]+\b")
+PLACEHOLDER = re.compile(r"(<text>|<n>|<name>(?: <name>)*)")
+
+# Capitalized words that are part of a message rather than a name
+KEEP_WORDS = {
+    "A",
+    "An",
+    "Beginning",
+    "Earth",
+    "Friends",
+    "Game",
+    "Insufficient",
+    "It",
+    "Players",
+    "The",
+    "There",
+    "To",
+    "Welcome",
+    "You",
+    "Your",
+}
+
+TIMESTAMP = re.compile(r"^\[\w{3} \w{3} \d{2} \d{2}:\d{2}:\d{2} \d{4}\] ")
+
+
+def template(line):
+    """Mask quoted text, numbers and names out of a line"""
+    line = QUOTED.sub("<text>", line)
+    line = NUMBER.sub("<n>", line)
+    line = NAME.sub(
+        lambda word: word.group(0) if word.group(0) in KEEP_WORDS else "<name>", line
+    )
+
+    return line
+
+
+def candidate_regex(line_template):
+    """Build a parser.py style pattern matching a template"""
+    pattern = "^"
+    for part in PLACEHOLDER.split(line_template):
+        if part == "<text>":
+            pattern += r"\'.+\'"
+        elif part == "<n>":
+            pattern += r"\d+"
+        elif part == "<name>":
+            pattern += r"\w+"
+        elif part.startswith("<name>"):
+            pattern += r"[a-zA-Z\s]+"
+        else:
+            pattern += re.escape(part).replace("\\ ", " ")
+
+    return pattern + "$"
+
+
+def read_lines(path, everything):
+    """
+    Yield (count, line) from an undetermined.txt or a char log. Char log
+    lines lose their timestamp and, unless everything is set, are only
+    kept if the classifier cannot place them.
+    """
+    determine = None
+    if not everything:
+        import eqa.lib.parser as eqa_parser
+
+        determine = eqa_parser.classifier.classify
+
+    log_file = open(path, "r", encoding="utf-8", errors="replace")
+    for raw in log_file:
+        line = raw.rstrip("\r\n")
+        count = 1
+        stamp = TIMESTAMP.match(line)
+        if stamp is not None:
+            line = line[stamp.end() :]
+            if determine is not None and determine(line) != "undetermined":
+                continue
+        else:
+            # undetermined.txt rows are "<count>\t<line>"
+            head, tab, rest = line.partition("\t")
+            if tab and head.isdigit():
+                count = int(head)
+                line = rest
+        if line:
+            yield count, line
+    log_file.close()
+
+
+def cluster(lines, samples=3):
+    """Return [count, template, sample lines] per template, largest first"""
+    clusters = {}
+    for count, line in lines:
+        line_template = template(line)
+        if line_template not in clusters:
+            clusters[line_template] = [0, line_template, []]
+        found = clusters[line_template]
+        found[0] += count
+        if len(found[2]) < samples and line not in found[2]:
+            found[2].append(line)
+
+    return sorted(clusters.values(), key=lambda found: found[0], reverse=True)
+
+
+def report(clusters, total, top):
+    """Format the largest clusters"""
+    output = []
+    for rank, (count, line_template, sample_lines) in enumerate(clusters[:top], 1):
+        pattern = candidate_regex(line_template)
+        output.append(
+            "#"
+            + str(rank)
+            + "  "
+            + str(count)
+            + " lines ("
+            + "{:.1%}".format(count / total)
+            + ")"
+        )
+        output.append("  template: " + line_template)
+        output.append("  regex:    " + pattern)
+        compiled = re.compile(pattern)
+        for sample in sample_lines:
+            mark = "  " if compiled.fullmatch(sample) else "! "
+            output.append("  " + mark + sample)
+        output.append("")
+
+    return "\n".join(output)
+
+
+def main(argv=None):
+    """Print the most common undetermined line templates"""
+    parser = argparse.ArgumentParser(
+        prog="python -m eqa.lib.cluster",
+        description="Group undetermined lines into templates with candidate rules",
+    )
+    parser.add_argument("path", help="undetermined.txt or a character log")
+    parser.add_argument("--top", type=int, default=20, help="clusters to show")
+    parser.add_argument("--samples", type=int, default=3, help="lines per cluster")
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="cluster every char log line, not just undetermined ones",
+    )
+    args = parser.parse_args(argv)
+
+    clusters = cluster(read_lines(args.path, args.all), args.samples)
+    total = sum(found[0] for found in clusters)
+    if not total:
+        print("No lines to cluster")
+        return
+
+    print(
+        str(total)
+        + " lines in "
+        + str(len(clusters))
+        + " templates, top "
+        + str(min(args.top, len(clusters)))
+        + ":\n"
+    )
+    print(report(clusters, total, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -17,13 +17,160 @@
    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 """
 
+import copy
 import json
 import os
+import stat
 import sys
+import tempfile
+import threading
 
 import eqa.lib.settings as eqa_settings
 import eqa.lib.state as eqa_state
 
+# Seconds a mutation may sit in memory before it is written to disk
+FLUSH_DELAY = 5.0
+
+# Append-only record of character state, kept out of config.json
+STATE_JOURNAL = "state.jsonl"
+
+# Mode open() gives a new file, read once while only one thread runs
+UMASK = os.umask(0)
+os.umask(UMASK)
+NEW_FILE_MODE = 0o666 & ~UMASK
+
+stores = {}
+stores_lock = threading.Lock()
+
+
+class EQA_Config_Store:
+    """Hold config.json in memory and write it behind mutations"""
+
+    def __init__(self, base_path):
+        """Load the document and start clean"""
+        self.path = base_path + "config.json"
+        self.lock = threading.RLock()
+        self.pending = []
+        self.timer = None
+        self.load()
+
+    def signature(self):
+        """Identify the on-disk file so outside edits can be noticed"""
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return None
+
+    def load(self):
+        """Read the document from disk"""
+        json_data = open(self.path, "r", encoding="utf-8")
+        self.data = json.load(json_data)
+        json_data.close()
+        self.disk = self.signature()
+
+    def sync(self):
+        """Pick up outside edits, replaying mutations not yet written"""
+        with self.lock:
+            if self.signature() == self.disk:
+                return
+            self.load()
+            for change in self.pending:
+                try:
+                    change(self.data)
+                except Exception as e:
+                    eqa_settings.log("config store: Dropped change: " + str(e))
+
+    def read(self):
+        """Return a private copy of the current document"""
+        with self.lock:
+            self.sync()
+            return copy.deepcopy(self.data)
+
+    def update(self, change):
+        """Apply change(data) now and schedule it to be written"""
+        with self.lock:
+            change(self.data)
+            self.pending.append(change)
+            if self.timer is None:
+                self.timer = threading.Timer(FLUSH_DELAY, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """Atomically write the document if anything changed"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.pending:
+                return
+            # Runs on the timer thread too, so nothing may escape. Pending
+            # changes are kept for the next update or the flush on exit.
+            try:
+                self.sync()
+                write_atomic(
+                    self.path,
+                    json.dumps(self.data, sort_keys=True, ensure_ascii=False, indent=2),
+                )
+            except Exception as e:
+                eqa_settings.log(
+                    "config store flush: Error on line "
+                    + str(sys.exc_info()[-1].tb_lineno)
+                    + ": "
+                    + str(e)
+                )
+                return
+            self.disk = self.signature()
+            self.pending = []
+
+
+def write_atomic(path, text):
+    """Replace path with text without ever leaving a partial file"""
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path)
+    )
+    try:
+        tmp_file = os.fdopen(fd, "w", encoding="utf-8")
+        tmp_file.write(text)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+        tmp_file.close()
+        # mkstemp makes the file 0600, keep the mode path already had
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = NEW_FILE_MODE
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store(base_path):
+    """Return the process-wide store for base_path"""
+    with stores_lock:
+        if base_path not in stores:
+            stores[base_path] = EQA_Config_Store(base_path)
+        return stores[base_path]
+
+
+def flush(base_path):
+    """Write any pending config changes to disk"""
+    try:
+        if base_path in stores:
+            stores[base_path].flush()
+
+    except Exception as e:
+        eqa_settings.log(
+            "config flush: Error on line "
+            + str(sys.exc_info()[-1].tb_lineno)
+            + ": "
+            + str(e)
+        )
+
 
 def init(base_path):
     """If there is no config, make a config"""
@@ -43,9 +190,7 @@ def init(base_path):
 def read_config(base_path):
     """read the config"""
     try:
-        json_data = open(base_path + "config.json", "r", encoding="utf-8")
-        config = json.load(json_data)
-        json_data.close()
+        config = store(base_path).read()
 
         return config
 
@@ -61,9 +206,7 @@ def read_config(base_path):
 def update_logs(base_path):
     """Add characters and servers of eqemu_ prefixed files in the log path"""
     try:
-        json_data = open(base_path + "config.json", "r", encoding="utf-8")
-        config = json.load(json_data)
-        json_data.close()
+        config = store(base_path).read()
         log_files = [
             f
             for f in os.listdir(config["settings"]["paths"]["char_log"])
@@ -93,33 +236,24 @@ def add_char_log(char, server, base_path):
     try:
         char_server = char + "_" + server
         char_log = "eqlog_" + char.title() + "_" + server + ".txt"
-        json_data = open(base_path + "config.json", "r", encoding="utf-8")
-        data = json.load(json_data)
-        json_data.close()
-        if not data["char_logs"]:
-            bootstrap_state(base_path, char, server)
-
-        json_data = open(base_path + "config.json", "r", encoding="utf-8")
-        data = json.load(json_data)
-        json_data.close()
-        data["char_logs"].update(
-            {
-                char_server: {
-                    "char": char,
-                    "server": server,
-                    "file_name": char_log,
-                    "disabled": "false",
-                    "char_state": {
-                        "location": {"x": "0.00", "y": "0.00", "z": "0.00"},
-                        "direction": "unavailable",
-                        "zone": "unavailable",
-                    },
-                }
+        char_entry = {
+            char_server: {
+                "char": char,
+                "server": server,
+                "file_name": char_log,
+                "disabled": "false",
+                "char_state": {
+                    "location": {"x": "0.00", "y": "0.00", "z": "0.00"},
+                    "direction": "unavailable",
+                    "zone": "unavailable",
+                },
             }
-        )
-        json_data = open(base_path + "config.json", "w", encoding="utf-8")
-        json.dump(data, json_data, sort_keys=True, indent=2)
-        json_data.close()
+        }
+        config_store = store(base_path)
+        with config_store.lock:
+            if not config_store.data["char_logs"]:
+                bootstrap_state(base_path, char, server)
+            config_store.update(lambda data: data["char_logs"].update(char_entry))
 
     except Exception as e:
         eqa_settings.log(
@@ -134,19 +268,12 @@ def bootstrap_state(base_path, char, server):
     """Generate and save state to config"""
 
     try:
-        json_data = open(base_path + "config.json", "r", encoding="utf-8")
-        data = json.load(json_data)
-        json_data.close()
-        data["last_state"].update(
-            {
-                "server": server,
-                "character": char,
-                "afk": "false",
-            }
-        )
-        json_data = open(base_path + "config.json", "w", encoding="utf-8")
-        json.dump(data, json_data, sort_keys=True, indent=2)
-        json_data.close()
+        last_state = {
+            "server": server,
+            "character": char,
+            "afk": "false",
+        }
+        store(base_path).update(lambda data: data["last_state"].update(last_state))
 
     except Exception as e:
         eqa_settings.log(
@@ -177,43 +304,26 @@ def get_config_chars(config):
 
 
 def set_last_state(state, base_path):
-    """Save state to config"""
+    """Append state to the state journal"""
 
     try:
-        json_data = open(base_path + "config.json", "r", encoding="utf-8")
-        data = json.load(json_data)
-        json_data.close()
-        data["last_state"].update(
-            {
-                "server": str(state.server),
-                "character": str(state.char),
-                "afk": str(state.afk),
-            }
-        )
-        data["char_logs"][state.char + "_" + state.server].update(
-            {
-                "char": str(state.char),
-                "disabled": "false",
-                "file_name": "eqlog_"
-                + str(state.char)
-                + "_"
-                + str(state.server)
-                + ".txt",
-                "server": str(state.server),
-                "char_state": {
-                    "direction": str(state.direction),
-                    "location": {
-                        "x": str(state.loc[1]),
-                        "y": str(state.loc[0]),
-                        "z": str(state.loc[2]),
-                    },
-                    "zone": str(state.zone),
+        record = {
+            "server": str(state.server),
+            "character": str(state.char),
+            "afk": str(state.afk),
+            "char_state": {
+                "direction": str(state.direction),
+                "location": {
+                    "x": str(state.loc[1]),
+                    "y": str(state.loc[0]),
+                    "z": str(state.loc[2]),
                 },
-            }
-        )
-        json_data = open(base_path + "config.json", "w", encoding="utf-8")
-        json.dump(data, json_data, sort_keys=True, ensure_ascii=False, indent=2)
-        json_data.close()
+                "zone": str(state.zone),
+            },
+        }
+        journal = open(base_path + STATE_JOURNAL, "a", encoding="utf-8")
+        journal.write(json.dumps(record, sort_keys=True, ensure_ascii=False) + "\n")
+        journal.close()
 
     except Exception as e:
         eqa_settings.log(
@@ -224,14 +334,54 @@ def set_last_state(state, base_path):
         )
 
 
+def replay_state(data, base_path):
+    """Apply the state journal to data and compact the journal"""
+
+    journal_path = base_path + STATE_JOURNAL
+    if not os.path.isfile(journal_path):
+        return
+
+    latest = {}
+    journal = open(journal_path, "r", encoding="utf-8")
+    for line in journal:
+        try:
+            record = json.loads(line)
+            char_server = record["character"] + "_" + record["server"]
+        except (ValueError, KeyError, TypeError):
+            # A torn final line from a crash, skip it
+            continue
+        latest.pop(char_server, None)
+        latest[char_server] = record
+    journal.close()
+
+    for char_server, record in latest.items():
+        if char_server in data["char_logs"]:
+            data["char_logs"][char_server]["char_state"] = record["char_state"]
+            data["last_state"].update(
+                {
+                    "server": record["server"],
+                    "character": record["character"],
+                    "afk": record["afk"],
+                }
+            )
+
+    # Keep one record per character, most recent last
+    write_atomic(
+        journal_path,
+        "".join(
+            json.dumps(record, sort_keys=True, ensure_ascii=False) + "\n"
+            for record in latest.values()
+        ),
+    )
+
+
 def get_last_state(base_path):
-    """Load state from config"""
+    """Load state from config and the state journal"""
 
     try:
         # Read config
-        json_data = open(base_path + "config.json", "r", encoding="utf-8")
-        data = json.load(json_data)
-        json_data.close()
+        data = store(base_path).read()
+        replay_state(data, base_path)
 
         # Populate State
         server = data["last_state"]["server"]
@@ -272,15 +422,8 @@ def add_type(line_type, base_path):
     """Adds default setting values for new line_type"""
 
     try:
-        json_data = open(base_path + "config.json", "r", encoding="utf-8")
-        data = json.load(json_data)
-        json_data.close()
-        data["line"].update(
-            {line_type: {"sound": "0", "reaction": "false", "alert": {}}}
-        )
-        json_data = open(base_path + "config.json", "w", encoding="utf-8")
-        json.dump(data, json_data, sort_keys=True, indent=2)
-        json_data.close()
+        line = {line_type: {"sound": "0", "reaction": "false", "alert": {}}}
+        store(base_path).update(lambda data: data["line"].update(line))
 
     except Exception as e:
         eqa_settings.log(
@@ -295,13 +438,8 @@ def add_zone(zone, base_path):
     """Adds default setting values for new zones"""
 
     try:
-        json_data = open(base_path + "config.json", "r", encoding="utf-8")
-        data = json.load(json_data)
-        json_data.close()
-        data["zones"].update({str(zone): "false"})
-        json_data = open(base_path + "config.json", "w", encoding="utf-8")
-        json.dump(data, json_data, sort_keys=True, indent=2)
-        json_data.close()
+        zone = str(zone)
+        store(base_path).update(lambda data: data["zones"].update({zone: "false"}))
 
     except Exception as e:
         eqa_settings.log(
@@ -1045,6 +1183,12 @@ def build_config(base_path):
     }
   },
   "settings": {
+    "audio": {
+      "sink": "device"
+    },
+    "parser": {
+      "cache_size": "1024"
+    },
     "paths": {
       "alert_log": "%slog/",
       "char_log": "%s/.wine/drive_c/Program Files/Sony/EverQuest/Logs/",
@@ -1057,6 +1201,10 @@ def build_config(base_path):
       "4": "watch out.wav",
       "5": "hello.wav"
     },
+    "tts": {
+      "backend": "gtts",
+      "cache_mb": "64"
+    },
     "version": "2.2.0"
   },
   "zones": {
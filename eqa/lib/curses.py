@@ -21,7 +21,6 @@
 import curses
 import os
 import sys
-import time
 
 import eqa.lib.struct as eqa_struct
 import eqa.lib.state as eqa_state
@@ -40,9 +39,8 @@ def display(stdscr, display_q, state, raid, exit_flag):
 
     try:
         while not exit_flag.is_set():
-            time.sleep(0.001)
-            if not display_q.empty():
-                display_event = display_q.get()
+            display_event = eqa_settings.consume(display_q, exit_flag)
+            if display_event is not None:
                 display_q.task_done()
 
                 # Display Var Update
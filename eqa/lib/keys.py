@@ -20,9 +20,9 @@
 
 import curses
 import sys
-import time
 
 import eqa.lib.settings as eqa_settings
+import eqa.lib.sound as eqa_sound
 import eqa.lib.struct as eqa_struct
 
 
@@ -45,12 +45,11 @@ def process(
     settings = "character"
     selected_char = 0
 
-    while key != ord("q") and key != 27:
+    while key != ord("q") and key != 27 and not exit_flag.is_set():
         try:
             # Get key
-            time.sleep(0.001)
-            if not keyboard_q.empty():
-                key = keyboard_q.get()
+            key = eqa_settings.consume(keyboard_q, exit_flag)
+            if key is not None:
                 keyboard_q.task_done()
 
                 # Handle resize event
@@ -120,7 +119,13 @@ def process(
                                     "Raid mode enabled",
                                 )
                             )
-                            sound_q.put(eqa_struct.sound("speak", "Raid mode enabled"))
+                            sound_q.put(
+                                eqa_struct.sound(
+                                    "speak",
+                                    "Raid mode enabled",
+                                    eqa_sound.PRIORITY_RAID,
+                                )
+                            )
                         elif raid.is_set():
                             raid.clear()
                             display_q.put(
@@ -131,7 +136,13 @@ def process(
                                     "Raid mode disabled",
                                 )
                             )
-                            sound_q.put(eqa_struct.sound("speak", "Raid mode disabled"))
+                            sound_q.put(
+                                eqa_struct.sound(
+                                    "speak",
+                                    "Raid mode disabled",
+                                    eqa_sound.PRIORITY_RAID,
+                                )
+                            )
                         display_q.put(
                             eqa_struct.display(
                                 eqa_settings.eqa_time(), "draw", "events", "null"
@@ -197,9 +208,11 @@ def process(
             eqa_settings.log("process keys: " + str(e))
             eqa_settings.log("setting exit_flag")
             exit_flag.set()
+            eqa_settings.wake(system_q)
             sys.exit()
 
     exit_flag.set()
+    eqa_settings.wake(system_q)
     sys.exit()
 
 
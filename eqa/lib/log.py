@@ -20,27 +20,77 @@
    Parse and react to eqemu logs
 """
 
+import ctypes
+import ctypes.util
+import os
+import select
 import time
 import sys
 
 import eqa.lib.settings as eqa_settings
 
 
+# inotify_add_watch mask, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+DIRECTORY_MASK = IN_CREATE | IN_MOVED_TO
+
+# Longest wait for a write before checking exit_flag and log_reload
+WATCH_TIMEOUT = 0.5
+
+# Bytes read from the log at a time
+CHUNK_SIZE = 65536
+
+
 def process(log_reload, exit_flag, char_log, log_q):
     """
     Process: char_log
     Produce: log_q
     """
 
+    watch = None
     try:
-        log_file = open(char_log, "r")
+        log_file = open(char_log, "rb")
         log_file.seek(0, 2)
+        watch = watch_log(char_log)
+        if watch is None:
+            eqa_settings.log("log_generator: inotify unavailable, polling " + char_log)
+        partial = b""
         while not exit_flag.is_set() and not log_reload.is_set():
-            line = log_file.readline()
-            if not line:
-                time.sleep(0.01)
+            chunk = log_file.read(CHUNK_SIZE)
+            if not chunk:
+                # Caught up, check the log was not truncated or replaced
+                status = log_status(log_file, char_log)
+                if status is not None:
+                    eqa_settings.log("log_generator: Log " + status + ": " + char_log)
+                    # The old contents are fully read, a partial line is whole
+                    if partial:
+                        log_q.put([partial.decode("utf-8", "replace")])
+                        partial = b""
+                    if status == "truncated":
+                        log_file.seek(0)
+                    else:
+                        log_file.close()
+                        log_file = open(char_log, "rb")
+                        if watch is not None:
+                            os.close(watch)
+                            watch = watch_log(char_log)
+                    continue
+                if watch is None:
+                    time.sleep(0.01)
+                else:
+                    wait_log(watch)
                 continue
-            log_q.put(line)
+            # Hand off complete lines, keep any trailing partial line
+            lines = (partial + chunk).split(b"\n")
+            partial = lines.pop()
+            if lines:
+                log_q.put([line.decode("utf-8", "replace") for line in lines])
     except Exception as e:
         eqa_settings.log(
             "log_generator: Error on line "
@@ -49,5 +99,63 @@ def process(log_reload, exit_flag, char_log, log_q):
             + str(e)
         )
 
+    if watch is not None:
+        os.close(watch)
     log_file.close()
     sys.exit()
+
+
+def watch_log(char_log):
+    """
+    Return an inotify descriptor watching char_log for writes, truncation
+    and replacement, and its directory for the log being recreated, or None
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        watch = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if watch < 0:
+            return None
+        log_path = os.fsencode(char_log)
+        if (
+            libc.inotify_add_watch(watch, log_path, WATCH_MASK) < 0
+            or libc.inotify_add_watch(
+                watch, os.path.dirname(os.path.abspath(log_path)), DIRECTORY_MASK
+            )
+            < 0
+        ):
+            os.close(watch)
+            return None
+        return watch
+
+    except (AttributeError, OSError, TypeError):
+        return None
+
+
+def log_status(log_file, char_log):
+    """
+    Return "replaced" if char_log is now a different file than log_file,
+    "truncated" if log_file shrank below the read offset, else None. A log
+    moved away and not yet recreated keeps being read.
+    """
+    try:
+        current = os.stat(char_log)
+    except FileNotFoundError:
+        return None
+    opened = os.fstat(log_file.fileno())
+    if (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+        return "replaced"
+    if opened.st_size < log_file.tell():
+        return "truncated"
+    return None
+
+
+def wait_log(watch):
+    """Block until the watched log changes or WATCH_TIMEOUT passes"""
+    ready, _, _ = select.select([watch], [], [], WATCH_TIMEOUT)
+    if ready:
+        # Drain queued events, the caller reads whatever was written
+        try:
+            while os.read(watch, 4096):
+                pass
+        except BlockingIOError:
+            pass
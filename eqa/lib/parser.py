@@ -21,46 +21,99 @@
 from collections import deque
 import sys
 import time
-import re
 
+import eqa.lib.classifier as eqa_classifier
 import eqa.lib.struct as eqa_struct
 import eqa.lib.settings as eqa_settings
 
 
-def process(exit_flag, log_q, action_q):
+# Seconds between log entries for lines without a timestamp
+SKIP_LOG_INTERVAL = 60
+
+# Fixed layout of a "[Mon Feb 12 23:40:36 2018] " line header
+HEADER_LENGTH = 27
+DAYS = {"Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"}
+MONTHS = {
+    "Jan": 1,
+    "Feb": 2,
+    "Mar": 3,
+    "Apr": 4,
+    "May": 5,
+    "Jun": 6,
+    "Jul": 7,
+    "Aug": 8,
+    "Sep": 9,
+    "Oct": 10,
+    "Nov": 11,
+    "Dec": 12,
+}
+
+# Skeleton cache entries when the config does not give a usable size
+CACHE_SIZE = 1024
+
+# Decoded headers, and the epoch at the top of each hour seen
+MAX_HEADERS = 4096
+headers = {}
+hour_epochs = {}
+
+
+def process(snapshots, exit_flag, log_q, action_q):
     """
     Process: log_q
     Produce: action_q
     """
 
     try:
+        snapshot = snapshots.current
+        classifier.set_cache_size(cache_size(snapshot.config))
+
+        skipped = 0
+        skip_logged = -SKIP_LOG_INTERVAL
+
         while not exit_flag.is_set():
-            time.sleep(0.001)
-            if not log_q.empty():
-                # Read raw log line
-                log_line = log_q.get()
+            # Read a batch of raw log lines
+            log_lines = eqa_settings.consume(log_q, exit_flag)
+            if log_lines is not None:
+                # Pick up a reloaded config between batches
+                if snapshots.current is not snapshot:
+                    snapshot = snapshots.current
+                    classifier.set_cache_size(cache_size(snapshot.config))
+                for log_line in log_lines:
+                    # Strip line of any trailing space
+                    line = log_line.strip()
+                    header = decode_header(line)
+                    if header is not None:
+                        timestamp, epoch, payload = header
+                        timestamp = timestamp + ".00"
+                        # Determine line type
+                        line_type, fields = determine(payload)
+                        if classifier.classified % eqa_classifier.REORDER_INTERVAL == 0:
+                            eqa_settings.log("process_log: " + classifier.report())
+                        # Build and queue action
+                        new_message = eqa_struct.message(
+                            timestamp,
+                            line_type,
+                            "null",
+                            "null",
+                            payload,
+                            fields,
+                            epoch,
+                        )
+                        action_q.put(new_message)
+                    else:
+                        skipped += 1
+                        if time.monotonic() - skip_logged >= SKIP_LOG_INTERVAL:
+                            eqa_settings.log(
+                                "process_log: Cannot process: "
+                                + line
+                                + " ("
+                                + str(skipped)
+                                + " lines without a timestamp since last report)"
+                            )
+                            skip_logged = time.monotonic()
+                            skipped = 0
+                # Done only once every line of the batch is queued
                 log_q.task_done()
-                # Strip line of any trailing space
-                line = log_line.strip()
-                if (
-                    re.fullmatch(
-                        r"^\[(?:Fri|Mon|S(?:at|un)|T(?:hu|ue)|Wed) (?:A(?:pr|ug)|Dec|Feb|J(?:an|u[ln])|Ma[ry]|Nov|Oct|Sep) [0-9]{2} [0-9]{2}\:[0-9]{2}\:[0-9]{2} [0-9]{4}\] .+",
-                        line,
-                    )
-                    is not None
-                ):
-                    # Split timestamp and message payload
-                    timestamp, payload = line[1:].split("] ", 1)
-                    timestamp = timestamp.split(" ")[3] + ".00"
-                    # Determine line type
-                    line_type = determine(payload)
-                    # Build and queue action
-                    new_message = eqa_struct.message(
-                        timestamp, line_type, "null", "null", payload
-                    )
-                    action_q.put(new_message)
-                else:
-                    eqa_settings.log("process_log: Cannot process: " + line)
 
     except Exception as e:
         eqa_settings.log(
@@ -70,841 +123,480 @@ def process(exit_flag, log_q, action_q):
             + str(e)
         )
 
+    eqa_settings.log("process_log: " + classifier.report())
 
-def determine(line):
-    """Determine type of line"""
 
+def cache_size(config):
+    """Configured bound on the skeleton cache, or the default"""
+    size = config["settings"].get("parser", {}).get("cache_size", CACHE_SIZE)
     try:
-        # Melee
-        line_type = check_melee(line)
-        if line_type is not None:
-            return line_type
-
-        # Spell
-        line_type = check_spell(line)
-        if line_type is not None:
-            return line_type
-
-        # Received Player Chat
-        line_type = check_received_chat(line)
-        if line_type is not None:
-            return line_type
-
-        # Sent Player Chat
-        line_type = check_sent_chat(line)
-        if line_type is not None:
-            return line_type
-
-        # Command Output
-        line_type = check_command_output(line)
-        if line_type is not None:
-            return line_type
-
-        # System Messages
-        line_type = check_system_messages(line)
-        if line_type is not None:
-            return line_type
-
-        # Group System Messages
-        line_type = check_group_system_messages(line)
-        if line_type is not None:
-            return line_type
-
-        # Loot Trade Messages
-        line_type = check_loot_trade(line)
-        if line_type is not None:
-            return line_type
-
-        # Emotes
-        line_type = check_emotes(line)
-        if line_type is not None:
-            return line_type
-
-        # Who
-        line_type = check_who(line)
-        if line_type is not None:
-            return line_type
-
-        # Pets
-        line_type = check_pets(line)
-        if line_type is not None:
-            return line_type
-
-        # No Match Found
-        return "undetermined"
-
-    except Exception as e:
+        return max(int(size), 0)
+    except (TypeError, ValueError):
         eqa_settings.log(
-            "process_log (determine): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
+            "process_log: Bad parser cache_size "
+            + str(size)
+            + ", using "
+            + str(CACHE_SIZE)
         )
-
-    return line_type
+        return CACHE_SIZE
 
 
-def check_melee(line):
+def decode_header(line):
     """
-    Check line for melee
+    Return (HH:MM:SS, epoch, payload) for a line starting with a timestamp
+    header, or None. Lines logged in the same second share a header, so
+    decoded headers are remembered and most lines cost one dict lookup.
     """
-    try:
-        # Melee Combat
-        if (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ (hits|crushes|slashes|pierces|bashes|backstabs|bites|kicks|claws|gores|punches|strikes|slices) [a-zA-Z\s]+ for \d+ points of damage\.",
-                line,
-            )
-            is not None
-        ):
-            return "combat_other_melee"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ tries to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) [a-zA-Z\s]+, but misses\!",
-                line,
-            )
-            is not None
-        ):
-            return "combat_other_melee_miss"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ tries to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) [a-zA-Z\s]+, but [a-zA-Z\s]+ dodges\!",
-                line,
-            )
-            is not None
-        ):
-            return "combat_other_melee_dodge"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ tries to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) [a-zA-Z\s]+, but [a-zA-Z\s]+ parries\!",
-                line,
-            )
-            is not None
-        ):
-            return "combat_other_melee_parry"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ tries to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) [a-zA-Z\s]+, but [a-zA-Z\s]+ blocks\!",
-                line,
-            )
-            is not None
-        ):
-            return "combat_other_melee_block"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ tries to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) [a-zA-Z\s]+, but [a-zA-Z\s]+ ripostes\!",
-                line,
-            )
-            is not None
-        ):
-            return "combat_other_melee_reposte"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ (hits|crushes|slashes|pierces|bashes|backstabs|bites|kicks|claws|gores|punches|strikes|slices) you for \d+ points of damage\.",
-                line,
-            )
-            is not None
-        ):
-            return "combat_you_receive_melee"
-        elif (
-            re.fullmatch(
-                r"^You (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) [a-zA-Z\s]+ for \d+ points of damage\.",
-                line,
-            )
-            is not None
-        ):
-            return "combat_you_melee"
-        elif (
-            re.fullmatch(
-                r"^You try to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) [a-zA-Z\s]+, but miss\!",
-                line,
-            )
-            is not None
-        ):
-            return "combat_you_melee_miss"
-        elif (
-            re.fullmatch(r"^[a-zA-Z\s]+ Scores a critical hit\!\(\d+\)$", line)
-            is not None
-        ):
-            return "combat_other_melee_crit"
-        elif (
-            re.fullmatch(r"^[a-zA-Z\s]+ has become (ENRAGED|enraged)\.$", line)
-            is not None
-        ):
-            return "mob_enrage_on"
-        elif re.fullmatch(r"^[a-zA-Z\s]+ is no longer enraged\.$", line) is not None:
-            return "mob_enrage_off"
-        elif (
-            re.fullmatch(r"^[a-zA-Z\s]+ goes on a (RAMPAGE|rampage)\.$", line)
-            is not None
-        ):
-            return "mob_rampage_on"
-        elif (
-            re.fullmatch(r"^[a-zA-Z\s]+ has been slain by [a-zA-Z\s]+\!$", line)
-            is not None
-        ):
-            return "mob_slain_other"
-        elif re.fullmatch(r"^You have slain [a-zA-Z\s]+\!$", line) is not None:
-            return "mob_slain_you"
-        elif (
-            re.fullmatch(r"^Your target is out of range, get closer\!$", line)
-            is not None
-        ):
-            return "mob_out_of_range"
-        elif re.fullmatch(r"^You gain experience\!\!$", line) is not None:
-            return "experience_solo"
-        elif re.fullmatch(r"^You gain party experience\!\!$", line) is not None:
-            return "experience_group"
-        elif re.fullmatch(r"^You are stunned\!$", line) is not None:
-            return "combat_you_stun_on"
-        elif re.fullmatch(r"^You are unstunned\.$", line) is not None:
-            return "combat_you_stun_off"
-
+    if len(line) <= HEADER_LENGTH:
         return None
-
-    except Exception as e:
-        eqa_settings.log(
-            "process_log (check_melee): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
-
-
-def check_spell(line):
-    """
-    Check line for spell
-    """
-    try:
-        if re.fullmatch(r"^[a-zA-Z\s]+ begins to cast a spell\.$", line) is not None:
-            return "spell_cast_other"
-        elif re.fullmatch(r"^You begin casting [a-zA-Z\s]+\.$", line) is not None:
-            return "spell_cast_you"
-        elif re.fullmatch(r"^\w+\'s spell fizzles\!$", line) is not None:
-            return "spell_fizzle_other"
-        elif re.fullmatch(r"^Your spell fizzles\!$", line) is not None:
-            return "spell_fizzle_you"
-        elif re.fullmatch(r"^Your spell did not take hold\.$", line) is not None:
-            return "spell_not_hold"
-        elif (
-            re.fullmatch(r"^Insufficient Mana to cast this spell\!$", line) is not None
-        ):
-            return "spell_cast_oom"
-        elif (
-            re.fullmatch(r"^[a-zA-Z\s]+\'s casting is interrupted\!$", line) is not None
-        ):
-            return "spell_interrupt_other"
-        elif re.fullmatch(r"^Your spell is interrupted\.$", line) is not None:
-            return "spell_interrupt_you"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ regains concentration and continues casting\.$", line
-            )
-            is not None
-        ):
-            return "spell_recover_other"
-        elif (
-            re.fullmatch(
-                r"^You regain your concentration and continue your casting\.$", line
-            )
-            is not None
-        ):
-            return "spell_recover_you"
-        elif re.fullmatch(r"^Your target resisted the .+ spell\.$", line) is not None:
-            return "spell_resist_you"
-        elif (
-            re.fullmatch(
-                r"^.+ w(?:ere|as) hit by non-melee for \d+ ?(points of) damage\.$", line
-            )
-            is not None
-        ):
-            return "spell_damage"
-        elif (
-            re.fullmatch(r"^Beginning to memorize [a-zA-Z\s\'\:]+\.\.\.$", line)
-            is not None
-        ):
-            return "spell_memorize_begin"
-        elif (
-            re.fullmatch(r"^You have finished memorizing [a-zA-Z\s\'\:]+\.$", line)
-            is not None
-        ):
-            return "spell_memorize_finish"
-        elif (
-            re.fullmatch(
-                r"^$You cannot memorize a spell you already have memorized\.", line
-            )
-            is not None
-        ):
-            return "spell_memorize_already"
-        elif re.fullmatch(r"^You forget .+\.", line) is not None:
-            return "spell_forget"
-        elif re.fullmatch(r"^\w+ begins to regenerate\.$", line) is not None:
-            return "spell_regen_on"
-        elif re.fullmatch(r"^Your [a-zA-Z\s]+ spell has worn off\.$", line) is not None:
-            return "spell_worn_off"
-        elif (
-            re.fullmatch(r"^You have healed .+ for \d+ points of damage\.$", line)
-            is not None
-        ):
-            return "spell_heal_you"
-        elif re.fullmatch(r"^Your target has been cured\.$", line) is not None:
-            return "spell_cured"
-        elif (
-            re.fullmatch(r"^Your gate is too unstable, and collapses\.$", line)
-            is not None
-        ):
-            return "spell_gate_collapse"
-        elif re.fullmatch(r"^You haven't recovered yet\.\.\.$", line) is not None:
-            return "spell_cooldown_active"
-
+    header = line[:HEADER_LENGTH]
+    decoded = headers.get(header)
+    if decoded is None:
+        if len(headers) >= MAX_HEADERS:
+            headers.clear()
+        decoded = headers[header] = read_header(header)
+    if not decoded:
         return None
 
-    except Exception as e:
-        eqa_settings.log(
-            "process_log (check_spell): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
+    return decoded[0], decoded[1], line[HEADER_LENGTH:]
 
 
-def check_received_chat(line):
+def read_header(header):
     """
-    Check line for received chat
+    Return (HH:MM:SS, epoch) for a "[Mon Feb 12 23:40:36 2018] " header, or
+    False, checking each field at its fixed offset. Epoch is local time,
+    mktime only runs once per hour of log.
     """
+    if (
+        header[0] != "["
+        or header[25:27] != "] "
+        or not header[4] == header[8] == header[11] == header[20] == " "
+        or not header[14] == header[17] == ":"
+        or header[1:4] not in DAYS
+        or header[5:8] not in MONTHS
+    ):
+        return False
+    digits = (
+        header[9:11] + header[12:14] + header[15:17] + header[18:20] + header[21:25]
+    )
+    if not (digits.isdigit() and digits.isascii()):
+        return False
+
+    hour_key = header[5:14] + header[21:25]
+    hour_epoch = hour_epochs.get(hour_key)
+    if hour_epoch is None:
+        try:
+            hour_epoch = int(
+                time.mktime(
+                    (
+                        int(digits[8:]),
+                        MONTHS[header[5:8]],
+                        int(digits[0:2]),
+                        int(digits[2:4]),
+                        0,
+                        0,
+                        0,
+                        0,
+                        -1,
+                    )
+                )
+            )
+        except (OverflowError, ValueError):
+            return header[12:20], None
+        hour_epochs[hour_key] = hour_epoch
 
-    try:
-        if re.fullmatch(r"^\w+ tells you, \'.+\'$", line) is not None:
-            return "tell"
-        elif re.fullmatch(r"^\w+ says, \'.+\'$", line) is not None:
-            return "say"
-        elif re.fullmatch(r"^\w+ shouts, \'.+\'$", line) is not None:
-            return "shout"
-        elif re.fullmatch(r"^\w+ tells the guild, \'.+\'$", line) is not None:
-            return "guild"
-        elif re.fullmatch(r"^\w+ tells the group, \'.+\'$", line) is not None:
-            return "group"
-        elif re.fullmatch(r"^\w+ says out of character, \'.+\'$", line) is not None:
-            return "ooc"
-        elif (
-            re.fullmatch(r"^\w+ auctions, \'(.+|)(WTS|selling|Selling)(.+|)\'$", line)
-            is not None
-        ):
-            return "auction_wts"
-        elif (
-            re.fullmatch(r"^\w+ auctions, \'(.+|)(WTB|buying|Buying)(.+|)\'$", line)
-            is not None
-        ):
-            return "auction_wtb"
-        elif re.fullmatch(r"^\w+ auctions, \'.+\'$", line) is not None:
-            return "auction"
-
-        return None
-
-    except Exception as e:
-        eqa_settings.log(
-            "process_log (check_received_chat): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
+    return header[12:20], hour_epoch + int(digits[4:6]) * 60 + int(digits[6:8])
 
 
-def check_sent_chat(line):
-    """
-    Check line for sent chat
-    """
+def determine(line):
+    """Determine type of line and the fields its rule captures"""
 
     try:
-        if re.fullmatch(r"^You told \w+(, \'| \'\[queued\],).+\'$", line) is not None:
-            return "you_tell"
-        elif re.fullmatch(r"^You say, \'.+\'$", line) is not None:
-            return "you_say"
-        elif re.fullmatch(r"^You shout, \'.+\'$", line) is not None:
-            return "you_shout"
-        elif re.fullmatch(r"^You say to your guild, \'.+\'$", line) is not None:
-            return "you_guild"
-        elif re.fullmatch(r"^You tell your party, \'.+\'$", line) is not None:
-            return "you_group"
-        elif re.fullmatch(r"^You say out of character, \'.+\'$", line) is not None:
-            return "you_ooc"
-        elif re.fullmatch(r"^You auction, \'.+\'$", line) is not None:
-            return "you_auction"
-
-        return None
+        return classifier.extract(line)
 
     except Exception as e:
         eqa_settings.log(
-            "process_log (check_sent_chat): Error on line "
+            "process_log (determine): Error on line "
             + str(sys.exc_info()[-1].tb_lineno)
             + ": "
             + str(e)
         )
 
-
-def check_command_output(line):
-    """
-    Check line for command output
-    """
-
-    try:
-        if (
-            re.fullmatch(
-                r"^Your Location is [-]?(?:\d*\.)?\d+\,\ [-]?(?:\d*\.)?\d+\,\ [-]?(?:\d*\.)?\d+$",
-                line,
-            )
-            is not None
-        ):
-            return "location"
-        elif (
-            re.fullmatch(
-                r"^You think you are heading (?:North(?:East|West)?|South(?:East|West)?|(?:Ea|We)st)\.$",
-                line,
-            )
-            is not None
-        ):
-            return "direction"
-        elif (
-            re.fullmatch(r"^You have no idea what direction you are facing\.$", line)
-            is not None
-        ):
-            return "direction_miss"
-        elif (
-            re.fullmatch(r"^You are now A\.F\.K\. \(Away From Keyboard\)\.", line)
-            is not None
-        ):
-            return "you_afk_on"
-        elif re.fullmatch(r"^You are now Looking For a Group\.", line) is not None:
-            return "you_lfg_on"
-        elif (
-            re.fullmatch(r"^You are no longer A\.F\.K\. \(Away From Keyboard\)\.", line)
-            is not None
-        ):
-            return "you_afk_off"
-        elif (
-            re.fullmatch(r"^You are no longer Looking For a Group\.", line) is not None
-        ):
-            return "you_lfg_off"
-        elif (
-            re.fullmatch(
+    return "undetermined", {}
+
+
+# Line types by family, checked in this order
+LINE_PATTERNS = [
+    # Melee
+    (
+        "melee",
+        [
+            (
+                "combat_other_melee",
+                r"^(?P<source>[a-zA-Z\s]+) (hits|crushes|slashes|pierces|bashes|backstabs|bites|kicks|claws|gores|punches|strikes|slices) (?P<target>[a-zA-Z\s]+) for (?P<amount>\d+) points of damage\.",
+            ),
+            (
+                "combat_other_melee_miss",
+                r"^(?P<source>[a-zA-Z\s]+) tries to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) (?P<target>[a-zA-Z\s]+), but misses\!",
+            ),
+            (
+                "combat_other_melee_dodge",
+                r"^(?P<source>[a-zA-Z\s]+) tries to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) (?P<target>[a-zA-Z\s]+), but [a-zA-Z\s]+ dodges\!",
+            ),
+            (
+                "combat_other_melee_parry",
+                r"^(?P<source>[a-zA-Z\s]+) tries to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) (?P<target>[a-zA-Z\s]+), but [a-zA-Z\s]+ parries\!",
+            ),
+            (
+                "combat_other_melee_block",
+                r"^(?P<source>[a-zA-Z\s]+) tries to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) (?P<target>[a-zA-Z\s]+), but [a-zA-Z\s]+ blocks\!",
+            ),
+            (
+                "combat_other_melee_reposte",
+                r"^(?P<source>[a-zA-Z\s]+) tries to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) (?P<target>[a-zA-Z\s]+), but [a-zA-Z\s]+ ripostes\!",
+            ),
+            (
+                "combat_you_receive_melee",
+                r"^(?P<source>[a-zA-Z\s]+) (hits|crushes|slashes|pierces|bashes|backstabs|bites|kicks|claws|gores|punches|strikes|slices) you for (?P<amount>\d+) points of damage\.",
+            ),
+            (
+                "combat_you_melee",
+                r"^You (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) (?P<target>[a-zA-Z\s]+) for (?P<amount>\d+) points of damage\.",
+            ),
+            (
+                "combat_you_melee_miss",
+                r"^You try to (hit|crush|slash|pierce|bash|backstab|bite|kick|claw|gore|punch|strike|slice) (?P<target>[a-zA-Z\s]+), but miss\!",
+            ),
+            (
+                "combat_other_melee_crit",
+                r"^(?P<source>[a-zA-Z\s]+) Scores a critical hit\!\((?P<amount>\d+)\)$",
+            ),
+            (
+                "mob_enrage_on",
+                r"^(?P<source>[a-zA-Z\s]+) has become (ENRAGED|enraged)\.$",
+            ),
+            ("mob_enrage_off", r"^(?P<source>[a-zA-Z\s]+) is no longer enraged\.$"),
+            (
+                "mob_rampage_on",
+                r"^(?P<source>[a-zA-Z\s]+) goes on a (RAMPAGE|rampage)\.$",
+            ),
+            (
+                "mob_slain_other",
+                r"^(?P<target>[a-zA-Z\s]+) has been slain by (?P<source>[a-zA-Z\s]+)\!$",
+            ),
+            ("mob_slain_you", r"^You have slain (?P<target>[a-zA-Z\s]+)\!$"),
+            ("mob_out_of_range", r"^Your target is out of range, get closer\!$"),
+            ("experience_solo", r"^You gain experience\!\!$"),
+            ("experience_group", r"^You gain party experience\!\!$"),
+            ("combat_you_stun_on", r"^You are stunned\!$"),
+            ("combat_you_stun_off", r"^You are unstunned\.$"),
+        ],
+    ),
+    # Spell
+    (
+        "spell",
+        [
+            ("spell_cast_other", r"^(?P<source>[a-zA-Z\s]+) begins to cast a spell\.$"),
+            ("spell_cast_you", r"^You begin casting (?P<spell>[a-zA-Z\s]+)\.$"),
+            ("spell_fizzle_other", r"^(?P<source>\w+)\'s spell fizzles\!$"),
+            ("spell_fizzle_you", r"^Your spell fizzles\!$"),
+            ("spell_not_hold", r"^Your spell did not take hold\.$"),
+            ("spell_cast_oom", r"^Insufficient Mana to cast this spell\!$"),
+            (
+                "spell_interrupt_other",
+                r"^(?P<source>[a-zA-Z\s]+)\'s casting is interrupted\!$",
+            ),
+            ("spell_interrupt_you", r"^Your spell is interrupted\.$"),
+            (
+                "spell_recover_other",
+                r"^(?P<source>[a-zA-Z\s]+) regains concentration and continues casting\.$",
+            ),
+            (
+                "spell_recover_you",
+                r"^You regain your concentration and continue your casting\.$",
+            ),
+            ("spell_resist_you", r"^Your target resisted the (?P<spell>.+) spell\.$"),
+            (
+                "spell_damage",
+                r"^(?P<target>.+) w(?:ere|as) hit by non-melee for (?P<amount>\d+) ?(points of) damage\.$",
+            ),
+            (
+                "spell_memorize_begin",
+                r"^Beginning to memorize (?P<spell>[a-zA-Z\s\'\:]+)\.\.\.$",
+            ),
+            (
+                "spell_memorize_finish",
+                r"^You have finished memorizing (?P<spell>[a-zA-Z\s\'\:]+)\.$",
+            ),
+            (
+                "spell_memorize_already",
+                r"^$You cannot memorize a spell you already have memorized\.",
+            ),
+            ("spell_forget", r"^You forget (?P<spell>.+)\."),
+            ("spell_regen_on", r"^(?P<target>\w+) begins to regenerate\.$"),
+            ("spell_worn_off", r"^Your (?P<spell>[a-zA-Z\s]+) spell has worn off\.$"),
+            (
+                "spell_heal_you",
+                r"^You have healed (?P<target>.+) for (?P<amount>\d+) points of damage\.$",
+            ),
+            ("spell_cured", r"^Your target has been cured\.$"),
+            ("spell_gate_collapse", r"^Your gate is too unstable, and collapses\.$"),
+            ("spell_cooldown_active", r"^You haven't recovered yet\.\.\.$"),
+        ],
+    ),
+    # Received Player Chat
+    (
+        "received_chat",
+        [
+            ("tell", r"^(?P<speaker>\w+) tells you, \'.+\'$"),
+            ("say", r"^(?P<speaker>\w+) says, \'.+\'$"),
+            ("shout", r"^(?P<speaker>\w+) shouts, \'.+\'$"),
+            ("guild", r"^(?P<speaker>\w+) tells the guild, \'.+\'$"),
+            ("group", r"^(?P<speaker>\w+) tells the group, \'.+\'$"),
+            ("ooc", r"^(?P<speaker>\w+) says out of character, \'.+\'$"),
+            (
+                "auction_wts",
+                r"^(?P<speaker>\w+) auctions, \'(.+|)(WTS|selling|Selling)(.+|)\'$",
+            ),
+            (
+                "auction_wtb",
+                r"^(?P<speaker>\w+) auctions, \'(.+|)(WTB|buying|Buying)(.+|)\'$",
+            ),
+            ("auction", r"^(?P<speaker>\w+) auctions, \'.+\'$"),
+        ],
+    ),
+    # Sent Player Chat
+    (
+        "sent_chat",
+        [
+            ("you_tell", r"^You told (?P<target>\w+)(, \'| \'\[queued\],).+\'$"),
+            ("you_say", r"^You say, \'.+\'$"),
+            ("you_shout", r"^You shout, \'.+\'$"),
+            ("you_guild", r"^You say to your guild, \'.+\'$"),
+            ("you_group", r"^You tell your party, \'.+\'$"),
+            ("you_ooc", r"^You say out of character, \'.+\'$"),
+            ("you_auction", r"^You auction, \'.+\'$"),
+        ],
+    ),
+    # Command Output
+    (
+        "command_output",
+        [
+            (
+                "location",
+                r"^Your Location is (?P<y>[-]?(?:\d*\.)?\d+)\,\ (?P<x>[-]?(?:\d*\.)?\d+)\,\ (?P<z>[-]?(?:\d*\.)?\d+)$",
+            ),
+            (
+                "direction",
+                r"^You think you are heading (?P<direction>North(?:East|West)?|South(?:East|West)?|(?:Ea|We)st)\.$",
+            ),
+            ("direction_miss", r"^You have no idea what direction you are facing\.$"),
+            ("you_afk_on", r"^You are now A\.F\.K\. \(Away From Keyboard\)\."),
+            ("you_lfg_on", r"^You are now Looking For a Group\."),
+            ("you_afk_off", r"^You are no longer A\.F\.K\. \(Away From Keyboard\)\."),
+            ("you_lfg_off", r"^You are no longer Looking For a Group\."),
+            (
+                "you_camping",
                 r"^It will take (you |)about (30|25|20|15|10|5) (more |)seconds to prepare your camp\.$",
-                line,
-            )
-            is not None
-        ):
-            return "you_camping"
-        elif (
-            re.fullmatch(r"^You abandon your preparations to camp\.$", line) is not None
-        ):
-            return "you_camping_abandoned"
-        elif re.fullmatch(r"^\*\*.+", line) is not None:
-            return "random"
-        elif re.fullmatch(r"^Game Time\:.+", line) is not None:
-            return "time_game"
-        elif re.fullmatch(r"^Earth Time\:.+", line) is not None:
-            return "time_earth"
-        elif re.fullmatch(r"^MESSAGE OF THE DAY\:.+", line) is not None:
-            return "motd_game"
-        elif re.fullmatch(r"^GUILD MOTD\:.+", line) is not None:
-            return "motd_guild"
-        elif (
-            re.fullmatch(r"^You can\'t use that command while casting\.\.\.$", line)
-            is not None
-        ):
-            return "command_block"
-
-        return None
-
-    except Exception as e:
-        eqa_settings.log(
-            "process_log (check_command_output): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
-
-
-def check_system_messages(line):
-    """
-    Check line for system messages
-    """
-
-    try:
-        if re.fullmatch(r"^You have entered [a-zA-Z\s\'\:]+\.$", line) is not None:
-            return "you_new_zone"
-        elif re.fullmatch(r"^LOADING, PLEASE WAIT\.\.\.$", line) is not None:
-            return "zoning"
-        elif re.fullmatch(r"^You are out of food\.", line) is not None:
-            return "you_outfood"
-        elif re.fullmatch(r"^You are out of drink\.", line) is not None:
-            return "you_outdrink"
-        elif re.fullmatch(r"^You are out of food and drink\.", line) is not None:
-            return "you_outfooddrink"
-        elif re.fullmatch(r"^You are out of food and low on drink\.", line) is not None:
-            return "you_outfoodlowdrink"
-        elif re.fullmatch(r"^You are out of drink and low on food\.", line) is not None:
-            return "you_outdrinklowfood"
-        elif re.fullmatch(r"^You are thirsty\.", line) is not None:
-            return "you_thirsty"
-        elif re.fullmatch(r"^You are hungry\.", line) is not None:
-            return "you_hungry"
-        elif re.fullmatch(r"^You are no longer encumbered\.$", line) is not None:
-            return "encumbered_off"
-        elif re.fullmatch(r"^You are encumbered\!$", line) is not None:
-            return "encumbered_on"
-        elif (
-            re.fullmatch(r"^You have become better at [a-zA-Z\s]+\! \(\d+\)$", line)
-            is not None
-        ):
-            return "skill_up"
-        elif re.fullmatch(r"^Welcome to level \d+\!", line) is not None:
-            return "ding_up"
-        elif (
-            re.fullmatch(r"^You LOST a level\! You are now level \d+\!", line)
-            is not None
-        ):
-            return "ding_down"
-        elif re.fullmatch(r"^It begins to rain\.$", line) is not None:
-            return "weather_start_rain"
-        elif re.fullmatch(r"^It begins to snow\.$", line) is not None:
-            return "weather_start_snow"
-        elif re.fullmatch(r"^You can\'t reach that, get closer\.$", line) is not None:
-            return "you_cannot_reach"
-        elif (
-            re.fullmatch(
+            ),
+            ("you_camping_abandoned", r"^You abandon your preparations to camp\.$"),
+            ("random", r"^\*\*.+"),
+            ("time_game", r"^Game Time\:.+"),
+            ("time_earth", r"^Earth Time\:.+"),
+            ("motd_game", r"^MESSAGE OF THE DAY\:.+"),
+            ("motd_guild", r"^GUILD MOTD\:.+"),
+            ("command_block", r"^You can\'t use that command while casting\.\.\.$"),
+        ],
+    ),
+    # System Messages
+    (
+        "system_messages",
+        [
+            ("you_new_zone", r"^You have entered (?P<zone>[a-zA-Z\s\'\:]+)\.$"),
+            ("zoning", r"^LOADING, PLEASE WAIT\.\.\.$"),
+            ("you_outfood", r"^You are out of food\."),
+            ("you_outdrink", r"^You are out of drink\."),
+            ("you_outfooddrink", r"^You are out of food and drink\."),
+            ("you_outfoodlowdrink", r"^You are out of food and low on drink\."),
+            ("you_outdrinklowfood", r"^You are out of drink and low on food\."),
+            ("you_thirsty", r"^You are thirsty\."),
+            ("you_hungry", r"^You are hungry\."),
+            ("encumbered_off", r"^You are no longer encumbered\.$"),
+            ("encumbered_on", r"^You are encumbered\!$"),
+            (
+                "skill_up",
+                r"^You have become better at (?P<skill>[a-zA-Z\s]+)\! \((?P<amount>\d+)\)$",
+            ),
+            ("ding_up", r"^Welcome to level (?P<amount>\d+)\!"),
+            ("ding_down", r"^You LOST a level\! You are now level (?P<amount>\d+)\!"),
+            ("weather_start_rain", r"^It begins to rain\.$"),
+            ("weather_start_snow", r"^It begins to snow\.$"),
+            ("you_cannot_reach", r"^You can\'t reach that, get closer\.$"),
+            (
+                "faction_line",
                 r"^Your faction standing with \w+ (?:could not possibly get any|got) (?:better|worse)\.$",
-                line,
-            )
-            is not None
-        ):
-            return "faction_line"
-        elif re.fullmatch(r"^[a-zA-Z\s]+ engages \w+\!$", line) is not None:
-            return "engage"
-        elif (
-            re.fullmatch(
+            ),
+            ("engage", r"^(?P<source>[a-zA-Z\s]+) engages (?P<target>\w+)\!$"),
+            (
+                "target",
                 r"^(Targeted \((NPC|Player)\)\: [a-zA-Z\s]+|You no longer have a target\.)",
-                line,
-            )
-            is not None
-        ):
-            return "target"
-        elif re.fullmatch(r"^Welcome to EverQuest\!$", line) is not None:
-            return "motd_welcome"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ is (?:behind and to the (?:righ|lef)t\.|ahead and to the (?:righ|lef)t\.|(?:straight ahead|behind you)\.|to the (?:righ|lef)t\.)$",
-                line,
-            )
-            is not None
-        ):
-            return "tracking"
-
-        return None
-
-    except Exception as e:
-        eqa_settings.log(
-            "process_log (check_system_messages): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
-
-
-def check_group_system_messages(line):
-    """
-    Check line for group system messages
-    """
-
-    try:
-        if re.fullmatch(r"^[a-zA-Z]+ has gone Linkdead.", line) is not None:
-            return "player_linkdead"
-        elif re.fullmatch(r"^You have joined the group\.", line) is not None:
-            return "group_joined"
-        elif re.fullmatch(r"^\w+ has joined the group\.$", line) is not None:
-            return "group_joined_other"
-        elif re.fullmatch(r"^\w+ has left the group\.$", line) is not None:
-            return "group_leave_other"
-        elif re.fullmatch(r"^You have been removed from the group\.", line) is not None:
-            return "group_removed"
-        elif (
-            re.fullmatch(r"^You invite [a-zA-Z]+ to join your group\.$", line)
-            is not None
-        ):
-            return "group_invite_other"
-        elif (
-            re.fullmatch(r"^[a-zA-Z]+ invites you to join a group\.$", line) is not None
-        ):
-            return "group_invite_you"
-        elif (
-            re.fullmatch(
+            ),
+            ("motd_welcome", r"^Welcome to EverQuest\!$"),
+            (
+                "tracking",
+                r"^(?P<target>[a-zA-Z\s]+) is (?:behind and to the (?:righ|lef)t\.|ahead and to the (?:righ|lef)t\.|(?:straight ahead|behind you)\.|to the (?:righ|lef)t\.)$",
+            ),
+        ],
+    ),
+    # Group System Messages
+    (
+        "group_system_messages",
+        [
+            ("player_linkdead", r"^(?P<source>[a-zA-Z]+) has gone Linkdead."),
+            ("group_joined", r"^You have joined the group\."),
+            ("group_joined_other", r"^(?P<source>\w+) has joined the group\.$"),
+            ("group_leave_other", r"^(?P<source>\w+) has left the group\.$"),
+            ("group_removed", r"^You have been removed from the group\."),
+            (
+                "group_invite_other",
+                r"^You invite (?P<target>[a-zA-Z]+) to join your group\.$",
+            ),
+            (
+                "group_invite_you",
+                r"^(?P<source>[a-zA-Z]+) invites you to join a group\.$",
+            ),
+            (
+                "group_invite_instruction",
                 r"^To join the group, click on the \'FOLLOW\' option, or \'DISBAND\' to cancel\.$",
-                line,
-            )
-            is not None
-        ):
-            return "group_invite_instruction"
-        elif re.fullmatch(r"^Your group has been disbanded\.$", line) is not None:
-            return "group_disbanded"
-        elif (
-            re.fullmatch(
-                r"^You notify [a-zA-Z]+ that you agree to join the group\.$", line
-            )
-            is not None
-        ):
-            return "group_join_notify"
-
-        return None
-
-    except Exception as e:
-        eqa_settings.log(
-            "process_log (check_group_system_messages): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
-
-
-def check_loot_trade(line):
-    """
-    Check line for looting or trading
-    """
-
-    try:
-        if re.fullmatch(r"^\-\-\w+ has looted [a-zA-Z\s\:]+\.\-\-$", line) is not None:
-            return "looted_item_other"
-        elif (
-            re.fullmatch(r"^\-\-You have looted [a-zA-Z\s\:]+\.\-\-$", line) is not None
-        ):
-            return "looted_item_you"
-        elif (
-            re.fullmatch(
+            ),
+            ("group_disbanded", r"^Your group has been disbanded\.$"),
+            (
+                "group_join_notify",
+                r"^You notify [a-zA-Z]+ that you agree to join the group\.$",
+            ),
+        ],
+    ),
+    # Loot Trade Messages
+    (
+        "loot_trade",
+        [
+            (
+                "looted_item_other",
+                r"^\-\-(?P<source>\w+) has looted (?P<item>[a-zA-Z\s\:]+)\.\-\-$",
+            ),
+            ("looted_item_you", r"^\-\-You have looted (?P<item>[a-zA-Z\s\:]+)\.\-\-$"),
+            (
+                "looted_money_you",
                 r"^You receive (\d+ platinum, |)(\d+ gold, |)(\d+ silver and |)\d+ copper from the corpse\.$",
-                line,
-            )
-            is not None
-        ):
-            return "looted_money_you"
-        elif (
-            re.fullmatch(
+            ),
+            (
+                "looted_money_other",
                 r"^You receive \d+ platinum, \d+ gold, \d+ silver, \d+ copper as your split\.$",
-                line,
-            )
-            is not None
-        ):
-            return "looted_money_other"
-        elif (
-            re.fullmatch(r"^The total trade is\: \d+ PP, \d+ GP, \d+ SP, \d+ CP$", line)
-            is not None
-        ):
-            return "trade_money"
-        elif (
-            re.fullmatch(r"^[a-zA-Z]+ has offered you [a-zA-Z\s]+\.$", line) is not None
-        ):
-            return "trade_item"
-
-        return None
-
-    except Exception as e:
-        eqa_settings.log(
-            "process_log (check_loot_trade): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
-
-
-def check_emotes(line):
-    """
-    Check line for emotes
-    """
-
-    try:
-        if re.fullmatch(r"^\w+ bows before \w+\.$", line) is not None:
-            return "emote_bow_other"
-        elif re.fullmatch(r"^\w+ thanks \w+ heartily\.$", line) is not None:
-            return "emote_thank_other"
-        elif re.fullmatch(r"^\w+ waves at \w+\.$", line) is not None:
-            return "emote_wave_other"
-        elif (
-            re.fullmatch(
+            ),
+            ("trade_money", r"^The total trade is\: \d+ PP, \d+ GP, \d+ SP, \d+ CP$"),
+            (
+                "trade_item",
+                r"^(?P<source>[a-zA-Z]+) has offered you (?P<item>[a-zA-Z\s]+)\.$",
+            ),
+        ],
+    ),
+    # Emotes
+    (
+        "emotes",
+        [
+            ("emote_bow_other", r"^\w+ bows before \w+\.$"),
+            ("emote_thank_other", r"^\w+ thanks \w+ heartily\.$"),
+            ("emote_wave_other", r"^\w+ waves at \w+\.$"),
+            (
+                "emote_dance_other",
                 r"^\w+ grabs hold of \w+ and begins to dance with (?:h(?:er|im)|it)\.$",
-                line,
-            )
-            is not None
-        ):
-            return "emote_dance_other"
-        elif re.fullmatch(r"^\w+ bonks \w+ on the head\!$", line) is not None:
-            return "emote_bonk_other"
-        elif re.fullmatch(r"^\w+ beams a smile at (a|) \w+$", line) is not None:
-            return "emote_smile_other"
-        elif re.fullmatch(r"^\w+ cheers at \w+$", line) is not None:
-            return "emote_cheer_other"
-
-        return None
-
-    except Exception as e:
-        eqa_settings.log(
-            "process_log (check_emotes): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
-
-
-def check_who(line):
-    """
-    Check line for who output
-    """
-
-    try:
-        if re.fullmatch(r"^Players (on|in) EverQuest\:$", line) is not None:
-            return "who_top"
-        elif re.fullmatch(r"^Friends currently on EverQuest\:$", line) is not None:
-            return "who_top_friends"
-        elif re.fullmatch(r"^Players Looking For Groups\:$", line) is not None:
-            return "who_top_lfg"
-        elif (
-            re.fullmatch(
-                r"^\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-$", line
-            )
-            is not None
-        ):
-            return "who_line"
-        elif (
-            re.fullmatch(
+            ),
+            ("emote_bonk_other", r"^\w+ bonks \w+ on the head\!$"),
+            ("emote_smile_other", r"^\w+ beams a smile at (a|) \w+$"),
+            ("emote_cheer_other", r"^\w+ cheers at \w+$"),
+        ],
+    ),
+    # Who
+    (
+        "who",
+        [
+            ("who_top", r"^Players (on|in) EverQuest\:$"),
+            ("who_top_friends", r"^Friends currently on EverQuest\:$"),
+            ("who_top_lfg", r"^Players Looking For Groups\:$"),
+            ("who_line", r"^\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-\-$"),
+            (
+                "who_player",
                 r"^\[\d+ (?:(?:(?:Shadow )?Knigh|Hierophan|Revenan)t|(?:Elemental|Phantasm)ist|High Priest|Illusionist|(?:Grandmast|P(?:athfind|reserv)|C(?:hannel|avali)|(?:Enchan|Mas)t|(?:Begu|Def)il|Conjur|Sorcer|Wa(?:nder|rd)|(?:Crusa|Outri)d|Rang|Evok|Reav)er|Necromancer|(?:B(?:lackgu)?|Wiz)ard|Grave Lord|(?:T(?:roubadou|empla)|Warrio|Vica)r|A(?:rch Mage|ssassin)|Minstrel|Virtuoso|(?:(?:Myrmid|Champi)o|Magicia|Shama)n|(?:Discipl|Oracl|R(?:ogu|ak))e|Luminary|Warlock|Heretic|Paladin|(?:Warlor|Drui)d|Cleric|Mystic|Monk)\] \w+ \((?:Barbarian|Halfling|Half\-Elf|(?:Dark|High) Elf|Wood Elf|Skeleton|Erudite|Iksar|Troll|(?:Gnom|Ogr)e|Dwarf|Human)\)(?:( \<[a-zA-Z\s]+\> ZONE\: \w+| \<[a-zA-Z\s]+\>|))$",
-                line,
-            )
-            is not None
-        ):
-            return "who_player"
-        elif (
-            re.fullmatch(
+            ),
+            (
+                "who_player_afk",
                 r"^AFK \[\d+ (?:(?:(?:Shadow )?Knigh|Hierophan|Revenan)t|(?:Elemental|Phantasm)ist|High Priest|Illusionist|(?:Grandmast|P(?:athfind|reserv)|C(?:hannel|avali)|(?:Enchan|Mas)t|(?:Begu|Def)il|Conjur|Sorcer|Wa(?:nder|rd)|(?:Crusa|Outri)d|Rang|Evok|Reav)er|Necromancer|(?:B(?:lackgu)?|Wiz)ard|Grave Lord|(?:T(?:roubadou|empla)|Warrio|Vica)r|A(?:rch Mage|ssassin)|Minstrel|Virtuoso|(?:(?:Myrmid|Champi)o|Magicia|Shama)n|(?:Discipl|Oracl|R(?:ogu|ak))e|Luminary|Warlock|Heretic|Paladin|(?:Warlor|Drui)d|Cleric|Mystic|Monk)\] \w+ \((?:Barbarian|Halfling|Half\-Elf|(?:Dark|High) Elf|Wood Elf|Skeleton|Erudite|Iksar|Troll|(?:Gnom|Ogr)e|Dwarf|Human)\)(?:( \<[a-zA-Z\s]+\> ZONE\: \w+| \<[a-zA-Z\s]+\>|))$",
-                line,
-            )
-            is not None
-        ):
-            return "who_player_afk"
-        elif (
-            re.fullmatch(
+            ),
+            (
+                "who_player_linkdead",
                 r"^\<LINKDEAD\>\[\d+ (?:(?:(?:Shadow )?Knigh|Hierophan|Revenan)t|(?:Elemental|Phantasm)ist|High Priest|Illusionist|(?:Grandmast|P(?:athfind|reserv)|C(?:hannel|avali)|(?:Enchan|Mas)t|(?:Begu|Def)il|Conjur|Sorcer|Wa(?:nder|rd)|(?:Crusa|Outri)d|Rang|Evok|Reav)er|Necromancer|(?:B(?:lackgu)?|Wiz)ard|Grave Lord|(?:T(?:roubadou|empla)|Warrio|Vica)r|A(?:rch Mage|ssassin)|Minstrel|Virtuoso|(?:(?:Myrmid|Champi)o|Magicia|Shama)n|(?:Discipl|Oracl|R(?:ogu|ak))e|Luminary|Warlock|Heretic|Paladin|(?:Warlor|Drui)d|Cleric|Mystic|Monk)\] \w+ \((?:Barbarian|Halfling|Half\-Elf|(?:Dark|High) Elf|Wood Elf|Skeleton|Erudite|Iksar|Troll|(?:Gnom|Ogr)e|Dwarf|Human)\)(?:( \<[a-zA-Z\s]+\> ZONE\: \w+| \<[a-zA-Z\s]+\>|))$",
-                line,
-            )
-            is not None
-        ):
-            return "who_player_linkdead"
-        elif (
-            re.fullmatch(
-                r"^\[ANONYMOUS\] \w+ (?:( \<[a-zA-Z\s]+\>))$(?:( \<[a-zA-Z\s]+\> ZONE\: \w+| \<[a-zA-Z\s]+\>|)",
-                line,
-            )
-            is not None
-        ):
-            return "who_player_anon"
-        elif (
-            re.fullmatch(
-                r"^\<LINKDEAD\>\[ANONYMOUS\] \w+ (?:( \<[a-zA-Z\s]+\>))$(?:( \<[a-zA-Z\s]+\> ZONE\: \w+| \<[a-zA-Z\s]+\>|)",
-                line,
-            )
-            is not None
-        ):
-            return "who_player_anon_linkdead"
-        elif (
-            re.fullmatch(
-                r"^There (is|are) \d+ (player|players) in [a-zA-Z\s]+\.$", line
-            )
-            is not None
-        ):
-            return "who_total"
-        elif (
-            re.fullmatch(
+            ),
+            (
+                "who_player_anon",
+                r"^\[ANONYMOUS\] \w+(?:( \<[a-zA-Z\s]+\> ZONE\: \w+| \<[a-zA-Z\s]+\>|))$",
+            ),
+            (
+                "who_player_anon_linkdead",
+                r"^\<LINKDEAD\>\[ANONYMOUS\] \w+(?:( \<[a-zA-Z\s]+\> ZONE\: \w+| \<[a-zA-Z\s]+\>|))$",
+            ),
+            (
+                "who_total",
+                r"^There (is|are) (?P<amount>\d+) (player|players) in (?P<zone>[a-zA-Z\s]+)\.$",
+            ),
+            (
+                "who_total_empty",
                 r"^There are no players in EverQuest that match those who filters\.$",
-                line,
-            )
-            is not None
-        ):
-            return "who_total_empty"
-        elif (
-            re.fullmatch(
+            ),
+            (
+                "who_total_local_empty",
                 r"^There are no players in [a-zA-Z\s]+ that match those who filters\.$",
-                line,
-            )
-            is not None
-        ):
-            return "who_total_local_empty"
-
-        return None
-
-    except Exception as e:
-        eqa_settings.log(
-            "process_log (check_who): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
-
-
-def check_pets(line):
-    """
-    Check line for pet responses
-    """
-
-    try:
-        if (
-            re.fullmatch(r"^[a-zA-Z\s]+ says, \'Following you, Master\.\'", line)
-            is not None
-        ):
-            return "pet_follow"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ says, \'No longer taunting attackers, Master\.\'", line
-            )
-            is not None
-        ):
-            return "pet_taunt_off"
-        elif (
-            re.fullmatch(r"^[a-zA-Z\s]+ says, \'At your service Master\.\'", line)
-            is not None
-        ):
-            return "pet_spawn"
-        elif (
-            re.fullmatch(r"^[a-zA-Z\s]+ says, \'Changing position, Master\.\'", line)
-            is not None
-        ):
-            return "pet_sit_stand"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ says, \'Guarding with my life\.\.oh splendid one\.\'",
-                line,
-            )
-            is not None
-        ):
-            return "pet_guard"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ says, \'Sorry, Master\.\.calming down\.\'", line
-            )
-            is not None
-        ):
-            return "pet_back"
-        elif (
-            re.fullmatch(
-                r"^[a-zA-Z\s]+ says, \'That is not a legal target master\.\'", line
-            )
-            is not None
-        ):
-            return "pet_illegal_target"
-
-        return None
-
-    except Exception as e:
-        eqa_settings.log(
-            "process_log (check_pets): Error on line "
-            + str(sys.exc_info()[-1].tb_lineno)
-            + ": "
-            + str(e)
-        )
+            ),
+        ],
+    ),
+    # Pets
+    (
+        "pets",
+        [
+            (
+                "pet_follow",
+                r"^(?P<speaker>[a-zA-Z\s]+) says, \'Following you, Master\.\'",
+            ),
+            (
+                "pet_taunt_off",
+                r"^(?P<speaker>[a-zA-Z\s]+) says, \'No longer taunting attackers, Master\.\'",
+            ),
+            (
+                "pet_spawn",
+                r"^(?P<speaker>[a-zA-Z\s]+) says, \'At your service Master\.\'",
+            ),
+            (
+                "pet_sit_stand",
+                r"^(?P<speaker>[a-zA-Z\s]+) says, \'Changing position, Master\.\'",
+            ),
+            (
+                "pet_guard",
+                r"^(?P<speaker>[a-zA-Z\s]+) says, \'Guarding with my life\.\.oh splendid one\.\'",
+            ),
+            (
+                "pet_back",
+                r"^(?P<speaker>[a-zA-Z\s]+) says, \'Sorry, Master\.\.calming down\.\'",
+            ),
+            (
+                "pet_illegal_target",
+                r"^(?P<speaker>[a-zA-Z\s]+) says, \'That is not a legal target master\.\'",
+            ),
+        ],
+    ),
+]
+
+
+# Built once, on import
+classifier = eqa_classifier.EQA_Classifier(LINE_PATTERNS)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,257 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/lib/replay.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+   Run an existing character log through the parser and action threads
+
+   eqalert replay path/to/eqlog_Char_server.txt [--speed N]
+"""
+
+import argparse
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+import eqa.lib.action as eqa_action
+import eqa.lib.config as eqa_config
+import eqa.lib.parser as eqa_parser
+import eqa.lib.settings as eqa_settings
+import eqa.lib.snapshot as eqa_snapshot
+
+
+# Raw lines handed to the parser at once, as log.process does
+BATCH_SIZE = 512
+
+
+class EQA_Counter:
+    """Stand in for a sink or a queue consumer, counting what it is given"""
+
+    def __init__(self):
+        """Start empty"""
+        self.counts = {}
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def add(self, key):
+        """Count key"""
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.total += 1
+
+
+class EQA_Reload_Queue(queue.Queue):
+    """
+    system_q that republishes the config as soon as a reload is queued,
+    as main does. At replay speed a reload on another thread would land
+    after many more lines had been handled with the old config.
+    """
+
+    def __init__(self, snapshots, work_path):
+        """Reload from the config in work_path"""
+        super().__init__()
+        self.snapshots = snapshots
+        self.work_path = work_path
+
+    def put(self, item, block=True, timeout=None):
+        """Queue item, reloading first if it asks for a reload"""
+        # The wake sentinel is not a message and has no tx
+        if getattr(item, "tx", None) == "reload_config":
+            self.snapshots.publish(eqa_config.read_config(self.work_path))
+        super().put(item, block, timeout)
+
+
+def drain(q, exit_flag, counter, key):
+    """Consume q until exit, counting key(item) for each item"""
+    while not exit_flag.is_set():
+        item = eqa_settings.consume(q, exit_flag)
+        if item is not None:
+            counter.add(key(item))
+            q.task_done()
+
+
+def feed(path, log_q, speed):
+    """
+    Queue the lines of path in batches. With a speed, hold each line until
+    its timestamp comes due at that multiple of real time.
+    """
+    lines = 0
+    batch = []
+    first_epoch = None
+    started = time.monotonic()
+    log_file = open(path, "r", encoding="utf-8", errors="replace")
+    for raw in log_file:
+        line = raw.rstrip("\r\n")
+        lines += 1
+        if speed:
+            header = eqa_parser.decode_header(line.strip())
+            if header is not None and header[1] is not None:
+                if first_epoch is None:
+                    first_epoch = header[1]
+                due = started + (header[1] - first_epoch) / speed
+                if due > time.monotonic():
+                    if batch:
+                        log_q.put(batch)
+                        batch = []
+                    time.sleep(max(due - time.monotonic(), 0))
+        batch.append(line)
+        if len(batch) >= BATCH_SIZE:
+            log_q.put(batch)
+            batch = []
+    log_file.close()
+    if batch:
+        log_q.put(batch)
+
+    return lines
+
+
+def replay(path, base_path, speed=0):
+    """Replay path and return a report of what the pipeline did"""
+
+    # Work on a copy of the config so auto-added types and zones stay here
+    work_path = tempfile.mkdtemp(prefix="eqa-replay-") + "/"
+    shutil.copy(base_path + "config.json", work_path + "config.json")
+    config = eqa_config.read_config(work_path)
+
+    log_q = queue.Queue()
+    action_q = queue.Queue()
+    display_q = queue.Queue()
+    sound_q = queue.Queue()
+    exit_flag = threading.Event()
+    raid = threading.Event()
+    snapshots = eqa_snapshot.EQA_Snapshots(eqa_action.build_plans)
+    snapshots.publish(config)
+    system_q = EQA_Reload_Queue(snapshots, work_path)
+
+    undetermined = EQA_Counter()
+    sounds = EQA_Counter()
+    displays = EQA_Counter()
+    systems = EQA_Counter()
+
+    threads = [
+        threading.Thread(
+            target=eqa_parser.process, args=(snapshots, exit_flag, log_q, action_q)
+        ),
+        threading.Thread(
+            target=eqa_action.process,
+            args=(
+                action_q,
+                system_q,
+                display_q,
+                sound_q,
+                exit_flag,
+                raid,
+                snapshots,
+                work_path,
+                undetermined,
+            ),
+        ),
+        threading.Thread(
+            target=drain,
+            args=(sound_q, exit_flag, sounds, lambda event: event.sound),
+        ),
+        threading.Thread(
+            target=drain,
+            args=(display_q, exit_flag, displays, lambda event: event.type),
+        ),
+        threading.Thread(
+            target=drain,
+            args=(system_q, exit_flag, systems, lambda event: event.tx),
+        ),
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    started = time.perf_counter()
+    lines = feed(path, log_q, speed)
+    for q in (log_q, action_q, sound_q, display_q, system_q):
+        q.join()
+    elapsed = time.perf_counter() - started
+
+    exit_flag.set()
+    eqa_settings.wake(log_q, action_q, sound_q, display_q, system_q)
+    for thread in threads:
+        thread.join()
+    eqa_config.flush(work_path)
+    shutil.rmtree(work_path, ignore_errors=True)
+
+    return report(lines, elapsed, sounds, displays, systems, undetermined)
+
+
+def report(lines, elapsed, sounds, displays, systems, undetermined):
+    """Format replay results"""
+    counts = eqa_parser.classifier.counts()
+    output = [
+        "Replayed "
+        + str(lines)
+        + " lines in "
+        + "{:.2f}".format(elapsed)
+        + "s, "
+        + "{:,.0f}".format(lines / elapsed if elapsed else 0)
+        + " lines/sec",
+        # Speech and display events include notices such as AFK, raid mode
+        # or an added line type as well as alerts
+        "Sounds: "
+        + str(sounds.counts.get("alert", 0))
+        + " alert sounds, "
+        + str(sounds.counts.get("speak", 0))
+        + " spoken",
+        "Display events: " + str(displays.counts.get("event", 0)),
+        "State updates: "
+        + ", ".join(
+            tx + "=" + str(count) for tx, count in sorted(systems.counts.items())
+        ),
+        "Undetermined: "
+        + str(undetermined.total)
+        + " lines, "
+        + str(len(undetermined.counts))
+        + " distinct",
+        "Line types:",
+    ]
+    for line_type, count in counts.items():
+        output.append("  " + line_type + ": " + str(count))
+
+    return "\n".join(output)
+
+
+def main(argv, base_path):
+    """eqalert replay"""
+    parser = argparse.ArgumentParser(
+        prog="eqalert replay",
+        description="Run a character log through the parser and action stages",
+    )
+    parser.add_argument("path", help="character log to replay")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0,
+        help="replay at this multiple of real time, 0 for as fast as possible",
+    )
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(base_path + "config.json"):
+        print("Please run eqalert once to generate ~/.eqa/config.json")
+        exit(1)
+    if not os.path.isfile(args.path):
+        print("Cannot find " + args.path)
+        exit(1)
+
+    print(replay(args.path, base_path, args.speed))
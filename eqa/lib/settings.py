@@ -21,10 +21,18 @@
 from collections import namedtuple
 import datetime
 import logging
+import queue
 import sys
 import time
 
 
+# Put on a queue by wake() to unblock its consumer
+WAKE = object()
+
+# Longest a consumer blocks before checking its thread events again
+QUEUE_TIMEOUT = 1.0
+
+
 def usage():
     """Print some helpful things"""
     print("Something awful happened and we may never know what")
@@ -50,5 +58,29 @@ def log(message):
     logging.info("[" + timestamp() + "]: " + str(message))
 
 
+def consume(q, *events):
+    """
+    Block until q has an item and return it, or return None once any of
+    events is set. Whoever sets an event should wake() the queue so the
+    consumer notices right away, QUEUE_TIMEOUT is only a backstop.
+    """
+    while not any(event.is_set() for event in events):
+        try:
+            item = q.get(timeout=QUEUE_TIMEOUT)
+        except queue.Empty:
+            continue
+        if item is not WAKE:
+            return item
+        q.task_done()
+
+    return None
+
+
+def wake(*queues):
+    """Unblock consumers waiting in consume() so they check their events"""
+    for q in queues:
+        q.put(WAKE)
+
+
 if __name__ == "__main__":
     main()
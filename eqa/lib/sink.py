@@ -0,0 +1,134 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/lib/sink.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+import os
+import sys
+import threading
+
+import eqa.lib.settings as eqa_settings
+
+
+# Seconds between background flushes
+FLUSH_INTERVAL = 5.0
+
+# Distinct lines held before flushing early
+MAX_PENDING = 10000
+
+# Bytes written before the file is rotated to <path>.1
+MAX_BYTES = 10 * 1024 * 1024
+
+
+class EQA_Sink:
+    """Batch, deduplicate and periodically append lines to a file"""
+
+    def __init__(self, path, max_bytes=MAX_BYTES, interval=FLUSH_INTERVAL):
+        """
+        Lines are counted in memory and written as "<count>\t<line>", one
+        row per distinct line per flush. Once the file passes max_bytes it is
+        moved to <path>.1, replacing any older copy, so at most about twice
+        max_bytes is ever on disk.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.pending = {}
+        self.stop = threading.Event()
+        self.thread = None
+        self.lines = 0
+        self.rows = 0
+        self.rotations = 0
+
+    def add(self, line):
+        """Queue a line to be written"""
+        with self.lock:
+            self.pending[line] = self.pending.get(line, 0) + 1
+            self.lines += 1
+            full = len(self.pending) >= MAX_PENDING
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write pending lines"""
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+
+        if not pending:
+            return
+
+        rows = "".join(
+            str(count) + "\t" + line + "\n" for line, count in pending.items()
+        )
+        try:
+            with self.write_lock:
+                if (
+                    os.path.exists(self.path)
+                    and os.path.getsize(self.path) + len(rows) > self.max_bytes
+                ):
+                    os.replace(self.path, self.path + ".1")
+                    self.rotations += 1
+                sink_file = open(self.path, "a", encoding="utf-8")
+                sink_file.write(rows)
+                sink_file.close()
+                self.rows += len(pending)
+
+        except Exception as e:
+            eqa_settings.log(
+                "sink flush: Error on line "
+                + str(sys.exc_info()[-1].tb_lineno)
+                + ": "
+                + str(e)
+            )
+
+    def run(self):
+        """Flush every interval until closed"""
+        while not self.stop.wait(self.interval):
+            self.flush()
+
+    def start(self):
+        """Start flushing in the background"""
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        """Stop the background flush and write what is left"""
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        eqa_settings.log("sink: " + self.report())
+
+    def report(self):
+        """Summarize the counters for the log"""
+        with self.lock:
+            return (
+                os.path.basename(self.path)
+                + " "
+                + str(self.lines)
+                + " lines in "
+                + str(self.rows)
+                + " rows, "
+                + str(self.rotations)
+                + " rotations"
+            )
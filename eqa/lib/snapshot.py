@@ -0,0 +1,67 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/lib/snapshot.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+from collections import namedtuple
+import copy
+import threading
+
+import eqa.lib.alerts as eqa_alerts
+
+
+# Everything compiled from one config load, never modified once published
+snapshot = namedtuple(
+    "snapshot", ["version", "config", "alerts", "plans", "zones", "sounds"]
+)
+
+
+class EQA_Snapshots:
+    """Publish compiled config snapshots to running threads"""
+
+    def __init__(self, build_plans):
+        """
+        build_plans(config, alerts) maps line types to action steps. Readers
+        take self.current once per message, so a publish lands between
+        messages without stopping any thread.
+        """
+        self.build_plans = build_plans
+        self.lock = threading.Lock()
+        self.version = 0
+        self.current = None
+
+    def publish(self, config):
+        """Compile config and make it current"""
+        config = copy.deepcopy(config)
+        alerts = eqa_alerts.build(config)
+        plans = self.build_plans(config, alerts)
+        zones = dict(config["zones"])
+        sounds = {}
+        for line_type, settings in config["line"].items():
+            sound = settings.get("sound", "0")
+            if sound != "0" and sound in config["settings"]["sounds"]:
+                sounds[line_type] = (
+                    config["settings"]["paths"]["sound"]
+                    + config["settings"]["sounds"][sound]
+                )
+
+        with self.lock:
+            self.version += 1
+            self.current = snapshot(self.version, config, alerts, plans, zones, sounds)
+
+        return self.current
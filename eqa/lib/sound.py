@@ -18,49 +18,296 @@
    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 """
 
-import os
-import time
+from collections import deque
+from collections import namedtuple
+import heapq
 import sys
-import hashlib
-import gtts
+import threading
+import time
 from playsound import playsound
 
-import eqa.lib.struct as eqa_struct
+import eqa.lib.audio as eqa_audio
 import eqa.lib.settings as eqa_settings
+import eqa.lib.tts as eqa_tts
+
+
+# Sound priorities, lower plays first
+PRIORITY_RAID = 0
+PRIORITY_ALERT = 1
+PRIORITY_AMBIENT = 2
+
+# Priority of sound events that do not set one
+DEFAULT_PRIORITY = {"alert": PRIORITY_ALERT, "speak": PRIORITY_AMBIENT}
+
+# Seconds a sound may wait to start before it is no longer worth playing
+STALE_AFTER = {PRIORITY_RAID: 5.0, PRIORITY_ALERT: 10.0, PRIORITY_AMBIENT: 10.0}
+
+# Sounds played at once
+POOL_SIZE = 2
+
+# Longest wait at exit for a sound still playing
+JOIN_TIMEOUT = 1.0
+
+# Finished sound events kept for the report
+HISTORY = 256
+
+# What became of a sound event, times in seconds from its arrival
+played = namedtuple(
+    "played", ["sound", "payload", "priority", "waited", "started", "outcome"]
+)
+
+
+class EQA_Scheduler:
+    """Play sound events on a pool of workers, most urgent first"""
+
+    def __init__(self, locate, play, workers=POOL_SIZE):
+        """
+        locate(sound_event) returns the file to play, or None, and may take
+        a while to synthesize it. play(path) blocks until it has played.
+        """
+        self.locate = locate
+        self.play = play
+        self.pending = []
+        self.sequence = 0
+        self.ready = threading.Condition()
+        self.closed = False
+        self.active = 0
+        self.history = deque(maxlen=HISTORY)
+        self.outcomes = {"played": 0, "stale": 0, "preempted": 0, "failed": 0}
+        self.workers = [
+            threading.Thread(target=self.work, daemon=True) for worker in range(workers)
+        ]
+
+    def start(self):
+        """Start the workers"""
+        for worker in self.workers:
+            worker.start()
+
+    def add(self, sound_event):
+        """
+        Queue a sound event. A raid sound preempts every ambient sound still
+        waiting, those are dropped rather than played late.
+        """
+        priority = sound_event.priority
+        if priority is None:
+            priority = DEFAULT_PRIORITY.get(sound_event.sound, PRIORITY_AMBIENT)
+        arrived = time.monotonic()
+        with self.ready:
+            if priority == PRIORITY_RAID:
+                waiting = []
+                for entry in self.pending:
+                    if entry[0] == PRIORITY_AMBIENT:
+                        self.finish(entry, arrived, None, "preempted")
+                    else:
+                        waiting.append(entry)
+                if len(waiting) != len(self.pending):
+                    heapq.heapify(waiting)
+                    self.pending = waiting
+            heapq.heappush(
+                self.pending, (priority, self.sequence, arrived, sound_event)
+            )
+            self.sequence += 1
+            self.ready.notify()
+
+    def take(self):
+        """Wait for the most urgent sound still fresh, None once closed"""
+        with self.ready:
+            while True:
+                while not self.pending and not self.closed:
+                    self.ready.wait()
+                if self.closed:
+                    return None
+                entry = heapq.heappop(self.pending)
+                if time.monotonic() - entry[2] <= STALE_AFTER[entry[0]]:
+                    self.active += 1
+                    return entry
+                self.finish(entry, time.monotonic(), None, "stale")
+
+    def work(self):
+        """Play sounds until closed"""
+        while True:
+            entry = self.take()
+            if entry is None:
+                return
+            picked = time.monotonic()
+            started = None
+            try:
+                path = self.locate(entry[3])
+                started = time.monotonic()
+                if path is None:
+                    outcome = "failed"
+                elif started - entry[2] > STALE_AFTER[entry[0]]:
+                    # Synthesis took too long for it to still be useful
+                    outcome = "stale"
+                else:
+                    self.play(path)
+                    outcome = "played"
+            except Exception as e:
+                eqa_settings.log(
+                    "sound worker: Error on line "
+                    + str(sys.exc_info()[-1].tb_lineno)
+                    + ": "
+                    + str(e)
+                )
+                outcome = "failed"
+            with self.ready:
+                self.active -= 1
+                self.finish(entry, picked, started, outcome)
+
+    def finish(self, entry, picked, started, outcome):
+        """Record what became of a sound event, with self.ready held"""
+        priority, sequence, arrived, sound_event = entry
+        self.outcomes[outcome] += 1
+        self.history.append(
+            played(
+                sound_event.sound,
+                sound_event.payload,
+                priority,
+                picked - arrived,
+                None if started is None else started - arrived,
+                outcome,
+            )
+        )
+
+    def idle(self):
+        """Whether no sound is waiting or playing"""
+        with self.ready:
+            return not self.pending and not self.active
+
+    def close(self):
+        """Drop waiting sounds and stop the workers"""
+        with self.ready:
+            self.closed = True
+            self.pending = []
+            self.ready.notify_all()
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.join(JOIN_TIMEOUT)
+
+    def report(self):
+        """Summarize outcomes and latency of recent sounds for the log"""
+        with self.ready:
+            history = list(self.history)
+            outcomes = dict(self.outcomes)
+        waited = sorted(event.waited for event in history)
+        started = sorted(
+            event.started for event in history if event.outcome == "played"
+        )
+
+        def percentiles(times):
+            if not times:
+                return "n/a"
+            return (
+                "p50 "
+                + "{:.0f}ms".format(times[len(times) // 2] * 1000)
+                + " p99 "
+                + "{:.0f}ms".format(times[int(len(times) * 0.99)] * 1000)
+            )
+
+        return (
+            ", ".join(outcome + " " + str(count) for outcome, count in outcomes.items())
+            + ", queue wait "
+            + percentiles(waited)
+            + ", play start "
+            + percentiles(started)
+        )
+
+
+class EQA_Player:
+    """Play sound files through a sink, decoding each file once"""
+
+    def __init__(self, sink):
+        """sink None hands every file to playsound"""
+        self.sink = sink
+        self.pcm = eqa_audio.EQA_PCM_Cache()
+
+    def play(self, path):
+        """
+        Play path from memory through the sink, falling back to playsound
+        for files that are not PCM WAV or when the sink fails
+        """
+        sink = self.sink
+        if sink is not None:
+            sound = self.pcm.get(path)
+            if sound is not None:
+                try:
+                    sink.play(sound)
+                    return
+                except Exception as e:
+                    eqa_settings.log(
+                        "play sound: " + sink.name + " sink failed: " + str(e)
+                    )
+        play_sound(path)
+
+    def preload(self, paths):
+        """Decode paths ahead of their first play, forgetting older files"""
+        self.pcm.clear()
+        for path in paths:
+            self.pcm.get(path)
+
+    def use(self, sink):
+        """Play through another sink"""
+        old_sink = self.sink
+        self.sink = sink
+        if old_sink is not None:
+            old_sink.close()
+
+    def close(self):
+        """Stop the sink"""
+        self.use(None)
 
 
-def process(config, sound_q, exit_flag, cfg_reload):
+def process(snapshots, sound_q, exit_flag, base_path):
     """
     Process: sound_q
     Produce: sound event
     """
 
-    tmp_sound_file_path = "/tmp/eqa/sound/"
-
-    if not os.path.exists(tmp_sound_file_path):
-        os.makedirs(tmp_sound_file_path)
+    snapshot = snapshots.current
+    phrases = eqa_tts.EQA_Phrase_Cache(
+        base_path + "tts/",
+        eqa_tts.cache_bytes(snapshot.config),
+        *eqa_tts.select_backend(snapshot.config)
+    )
+    player = EQA_Player(eqa_audio.select_sink(snapshot.config))
+    player.preload(snapshot.sounds.values())
+    scheduler = EQA_Scheduler(
+        lambda sound_event: locate(snapshots.current, sound_event, phrases),
+        player.play,
+    )
+    scheduler.start()
+    prewarm = threading.Thread(
+        target=eqa_tts.prewarm,
+        args=(snapshots, phrases, exit_flag, scheduler.idle),
+        daemon=True,
+    )
+    prewarm.start()
 
     try:
-        while not exit_flag.is_set() and not cfg_reload.is_set():
-            time.sleep(0.01)
-            if not sound_q.empty():
-                sound_event = sound_q.get()
-                sound_q.task_done()
-
-                if sound_event.sound == "speak":
-                    speak(sound_event.payload, "true", tmp_sound_file_path)
-                elif sound_event.sound == "alert":
-                    alert(config, sound_event.payload)
-                else:
-                    speak(sound_event.payload, "true", tmp_sound_file_path)
-                    display_q.put(
-                        eqa_struct.display(
-                            eqa_settings.eqa_time(),
-                            "event",
-                            "events",
-                            "[Malformed sound event] " + sound_event.sound,
+        while not exit_flag.is_set():
+            sound_event = eqa_settings.consume(sound_q, exit_flag)
+            if sound_event is not None:
+                if snapshots.current is not snapshot:
+                    previous = snapshot
+                    snapshot = snapshots.current
+                    # A bad reload must not end the thread for the session
+                    try:
+                        reload(previous, snapshot, phrases, player)
+                    except Exception as e:
+                        eqa_settings.log(
+                            "process_sound: Reload error on line "
+                            + str(sys.exc_info()[-1].tb_lineno)
+                            + ": "
+                            + str(e)
                         )
-                    )
+                # Line types set to sound "0" alert silently, skip them
+                # rather than fill a worker and count a failure
+                if (
+                    sound_event.sound != "alert"
+                    or sound_event.payload in snapshot.sounds
+                ):
+                    scheduler.add(sound_event)
+                sound_q.task_done()
     except Exception as e:
         eqa_settings.log(
             "process_sound: Error on line "
@@ -68,34 +315,34 @@ def process(config, sound_q, exit_flag, cfg_reload):
             + ": "
             + str(e)
         )
-        sys.exit()
 
+    scheduler.close()
+    prewarm.join(JOIN_TIMEOUT)
+    phrases.close()
+    player.close()
+    eqa_settings.log("process_sound: " + scheduler.report())
+    eqa_settings.log("process_sound: " + phrases.report())
+    eqa_settings.log("process_sound: " + player.pcm.report())
     sys.exit()
 
 
-def speak(phrase, play, sound_file_path):
-    """Play a spoken phrase"""
-    try:
-        phrase_hash = hashlib.md5(phrase.encode())
-        if not os.path.exists(sound_file_path + phrase_hash.hexdigest() + ".wav"):
-            tts = gtts.gTTS(text=phrase, lang="en")
-            tts.save(sound_file_path + phrase_hash.hexdigest() + ".wav")
-        if play == "true":
-            play_sound(sound_file_path + phrase_hash.hexdigest() + ".wav")
+def reload(previous, snapshot, phrases, player):
+    """Apply a newly published snapshot to the phrase cache and player"""
+    phrases.resize(eqa_tts.cache_bytes(snapshot.config))
+    phrases.use(*eqa_tts.select_backend(snapshot.config))
+    if eqa_audio.sink_name(snapshot.config) != eqa_audio.sink_name(previous.config):
+        player.use(eqa_audio.select_sink(snapshot.config))
+    player.preload(snapshot.sounds.values())
 
-    except Exception as e:
-        eqa_settings.log(
-            "speak: Error on line " + str(sys.exc_info()[-1].tb_lineno) + ": " + str(e)
-        )
 
+def locate(snapshot, sound_event, phrases):
+    """Return the file to play for a sound event, or None"""
+    if sound_event.sound == "alert":
+        return snapshot.sounds.get(sound_event.payload)
+    if sound_event.sound != "speak":
+        eqa_settings.log("process_sound: Malformed sound event " + sound_event.sound)
 
-def alert(config, line_type):
-    """Play pre-generated sounds"""
-    if not config["line"][line_type]["sound"] == "0":
-        play_sound(
-            config["settings"]["paths"]["sound"]
-            + config["settings"]["sounds"][config["line"][line_type]["sound"]]
-        )
+    return phrases.path(sound_event.payload)
 
 
 def play_sound(sound):
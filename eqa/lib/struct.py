@@ -25,6 +25,10 @@ global display
 global sound
 global message
 
-message = namedtuple("data", ["timestamp", "type", "tx", "rx", "payload"])
+message = namedtuple(
+    "data",
+    ["timestamp", "type", "tx", "rx", "payload", "fields", "epoch"],
+    defaults=(None, None),
+)
 display = namedtuple("data", ["timestamp", "type", "screen", "payload"])
-sound = namedtuple("data", ["sound", "payload"])
+sound = namedtuple("data", ["sound", "payload", "priority"], defaults=(None,))
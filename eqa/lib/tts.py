@@ -0,0 +1,501 @@
+#! /usr/bin/env python
+
+"""
+   Program:   EQ Alert
+   File Name: eqa/lib/tts.py
+   Copyright (C) 2022 Michael Geitz
+
+   This program is free software; you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation; either version 2 of the License, or
+   (at your option) any later version.
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+   You should have received a copy of the GNU General Public License along
+   with this program; if not, write to the Free Software Foundation, Inc.,
+   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+from collections import OrderedDict
+import array
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import wave
+
+import eqa.lib.config as eqa_config
+import eqa.lib.settings as eqa_settings
+
+
+# Default bound on synthesized speech kept on disk
+CACHE_MB = 64
+
+# Backend used when the config does not name one
+BACKEND = "gtts"
+
+# Seconds to use the fallback backend after the configured one fails
+RETRY_AFTER = 60.0
+
+# Longest a local synthesizer may run for one phrase
+SYNTH_TIMEOUT = 10.0
+
+# Tone stand-in: sample rate, and seconds per word tone and gap
+TONE_RATE = 22050
+TONE_WORD = 0.12
+TONE_GAP = 0.04
+TONE_WORDS = 12
+
+INDEX = "index.json"
+
+# Spoken by eqalert itself rather than from a log line
+STATUS_PHRASES = [
+    "initialized",
+    "Configuration reloaded",
+    "Raid mode enabled",
+    "Raid mode disabled",
+]
+
+# Seconds between checks for a new config to pre-warm
+PREWARM_POLL = 1.0
+
+# Failed syntheses in a row before giving up on a pre-warm run
+PREWARM_FAILURES = 3
+
+# Share of the cache pre-warming may fill, the rest is left to live phrases
+PREWARM_SHARE = 0.5
+
+
+class EQA_Phrase_Cache:
+    """Synthesized phrases kept on disk, least recently used evicted first"""
+
+    def __init__(self, directory, max_bytes, backend, fallback=None):
+        """
+        Phrases are spoken by backend, or by fallback for RETRY_AFTER seconds
+        once backend fails. Files are named for the backend and phrase, so
+        changing backend never plays another backend's file. The index maps
+        each file to its phrase, size and last use, oldest use first.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.fallback = fallback
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.total = 0
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.prewarmed = 0
+        self.evictions = 0
+        self.generate_seconds = 0.0
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.load()
+
+    def load(self):
+        """Read the index, dropping entries whose file is gone"""
+        index = {}
+        if os.path.isfile(self.directory + INDEX):
+            try:
+                index_file = open(self.directory + INDEX, "r", encoding="utf-8")
+                index = json.load(index_file)
+                index_file.close()
+            except ValueError:
+                eqa_settings.log("tts cache: Unreadable index, starting over")
+
+        # Files without an entry are adopted as the oldest, to be evicted first
+        for name in os.listdir(self.directory):
+            if name.endswith(".wav") and name not in index:
+                stat = os.stat(self.directory + name)
+                index[name] = {
+                    "backend": None,
+                    "phrase": None,
+                    "bytes": stat.st_size,
+                    "used": 0,
+                }
+                self.dirty = True
+
+        for name, entry in sorted(index.items(), key=lambda item: item[1]["used"]):
+            if os.path.isfile(self.directory + name):
+                self.entries[name] = entry
+                self.total += entry["bytes"]
+            else:
+                self.dirty = True
+        self.evict()
+
+    def has(self, phrase):
+        """Whether phrase is cached, without counting it as a use"""
+        with self.lock:
+            return file_name(self.backend, phrase) in self.entries
+
+    def full(self, share=1.0):
+        """Whether the cache holds share of max_bytes or more"""
+        with self.lock:
+            return self.total >= self.max_bytes * share
+
+    def use(self, backend, fallback=None):
+        """Speak new phrases with another backend"""
+        with self.lock:
+            self.backend = backend
+            self.fallback = fallback
+            self.retry_at = 0.0
+
+    def path(self, phrase, prewarm=False):
+        """
+        Return the file speaking phrase, synthesizing it on a miss, or None.
+        Pre-warming never falls back, a stand-in is only worth making when
+        the phrase has to be played now.
+        """
+        with self.lock:
+            backend = self.backend
+            fallback = None if prewarm else self.fallback
+            if fallback is not None and time.monotonic() < self.retry_at:
+                backend = fallback
+        found = self.make(backend, phrase, prewarm)
+        if found is None and fallback is not None and backend is not fallback:
+            with self.lock:
+                self.retry_at = time.monotonic() + RETRY_AFTER
+            eqa_settings.log(
+                "tts cache: Using "
+                + fallback.name
+                + " for a while, "
+                + backend.name
+                + " failed"
+            )
+            found = self.make(fallback, phrase, prewarm)
+
+        return found
+
+    def make(self, backend, phrase, prewarm):
+        """Return the file of backend speaking phrase, or None"""
+        name = file_name(backend, phrase)
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None:
+                self.hits += 1
+                entry["used"] = time.time()
+                self.entries.move_to_end(name)
+                self.dirty = True
+                return self.directory + name
+            if prewarm:
+                self.prewarmed += 1
+            else:
+                self.misses += 1
+
+        # Synthesize outside the lock, other phrases stay playable meanwhile
+        started = time.monotonic()
+        tmp_path = self.directory + name + "." + str(threading.get_ident())
+        try:
+            backend.save(phrase, tmp_path)
+            os.replace(tmp_path, self.directory + name)
+            size = os.path.getsize(self.directory + name)
+        except Exception as e:
+            eqa_settings.log(
+                "tts cache: "
+                + backend.name
+                + " error on line "
+                + str(sys.exc_info()[-1].tb_lineno)
+                + ": "
+                + str(e)
+            )
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self.lock:
+                self.failures += 1
+            return None
+
+        with self.lock:
+            self.generate_seconds += time.monotonic() - started
+            if name in self.entries:
+                self.total -= self.entries[name]["bytes"]
+            self.entries[name] = {
+                "backend": backend.name,
+                "phrase": phrase,
+                "bytes": size,
+                "used": time.time(),
+            }
+            self.entries.move_to_end(name)
+            self.total += size
+            self.dirty = True
+            self.evict(keep=name)
+            self.save()
+
+        return self.directory + name
+
+    def evict(self, keep=None):
+        """Remove least recently used files until under max_bytes"""
+        while self.total > self.max_bytes and self.entries:
+            name = next(iter(self.entries))
+            if name == keep:
+                break
+            entry = self.entries.pop(name)
+            self.total -= entry["bytes"]
+            self.evictions += 1
+            self.dirty = True
+            if os.path.exists(self.directory + name):
+                os.remove(self.directory + name)
+
+    def resize(self, max_bytes):
+        """Change the bound, evicting down to it"""
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+            self.save()
+
+    def save(self):
+        """Write the index if it changed"""
+        if self.dirty:
+            eqa_config.write_atomic(
+                self.directory + INDEX, json.dumps(self.entries, indent=2)
+            )
+            self.dirty = False
+
+    def close(self):
+        """Write recent uses to the index"""
+        with self.lock:
+            self.save()
+
+    def report(self):
+        """Summarize the counters for the log"""
+        with self.lock:
+            return (
+                "tts cache "
+                + str(self.hits)
+                + " hits "
+                + str(self.misses)
+                + " misses "
+                + str(self.prewarmed)
+                + " pre-warmed "
+                + str(self.failures)
+                + " failures "
+                + str(self.evictions)
+                + " evictions, "
+                + str(len(self.entries))
+                + " phrases in "
+                + "{:.1f}".format(self.total / 1048576)
+                + "MB, "
+                + "{:.2f}".format(self.generate_seconds)
+                + "s synthesizing"
+            )
+
+
+class EQA_GTTS:
+    """Google Translate text to speech, needs network access"""
+
+    name = "gtts"
+    wav = False
+
+    def available(self):
+        """Whether gtts is installed"""
+        try:
+            import gtts
+
+            return True
+        except ImportError:
+            return False
+
+    def save(self, phrase, path):
+        """Write phrase spoken to path, MP3 data whatever the extension"""
+        import gtts
+
+        tts = gtts.gTTS(text=phrase, lang="en")
+        tts.save(path)
+
+
+class EQA_Espeak:
+    """A locally installed espeak-ng or espeak"""
+
+    name = "espeak"
+    wav = True
+
+    def __init__(self):
+        """Find the synthesizer on PATH"""
+        self.command = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def available(self):
+        """Whether an espeak is installed"""
+        return self.command is not None
+
+    def save(self, phrase, path):
+        """Write phrase spoken to path as WAV"""
+        subprocess.run(
+            [self.command, "-w", path, phrase],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=SYNTH_TIMEOUT,
+        )
+
+
+class EQA_Tone:
+    """
+    A stand-in needing nothing but Python, one short tone per word pitched
+    by the word, so repeated phrases at least sound alike
+    """
+
+    name = "tone"
+    wav = True
+
+    def available(self):
+        """Always"""
+        return True
+
+    def save(self, phrase, path):
+        """Write the tones for phrase to path as WAV"""
+        samples = array.array("h")
+        word_samples = int(TONE_RATE * TONE_WORD)
+        fade = word_samples // 8
+        for word in (phrase.split() or [phrase])[:TONE_WORDS]:
+            digest = hashlib.md5(word.lower().encode()).digest()
+            frequency = 440 + digest[0] * 2
+            for i in range(word_samples):
+                envelope = min(1.0, i / fade, (word_samples - i) / fade)
+                samples.append(
+                    int(
+                        9000
+                        * envelope
+                        * math.sin(2 * math.pi * frequency * i / TONE_RATE)
+                    )
+                )
+            samples.extend([0] * int(TONE_RATE * TONE_GAP))
+        if sys.byteorder == "big":
+            samples.byteswap()
+
+        wav_file = wave.open(path, "wb")
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(TONE_RATE)
+        wav_file.writeframes(samples.tobytes())
+        wav_file.close()
+
+
+BACKENDS = {"gtts": EQA_GTTS, "espeak": EQA_Espeak, "tone": EQA_Tone}
+
+
+def select_backend(config):
+    """
+    The configured backend, and the tone stand-in to fall back on when it
+    is not already the tone. A config without settings > tts keeps gtts,
+    an unknown backend or one not installed uses the tone.
+    """
+    name = config["settings"].get("tts", {}).get("backend", BACKEND)
+    if name not in BACKENDS:
+        eqa_settings.log("tts: Unknown backend " + name + ", using tone")
+        name = "tone"
+    backend = BACKENDS[name]()
+    if not backend.available():
+        eqa_settings.log("tts: " + name + " is not installed, using tone")
+        backend = EQA_Tone()
+    fallback = None if backend.name == "tone" else EQA_Tone()
+
+    return backend, fallback
+
+
+def file_name(backend, phrase):
+    """Cache file name of backend speaking phrase"""
+    return hashlib.md5((backend.name + ":" + phrase).encode()).hexdigest() + ".wav"
+
+
+def make_sound(config, phrase, path):
+    """
+    Write phrase to path as WAV with the configured backend, or the
+    fallback. Alert sounds are decoded into memory, which needs WAV, so a
+    backend writing anything else is swapped for espeak or the tone.
+    """
+    backend, fallback = select_backend(config)
+    if not backend.wav:
+        espeak = EQA_Espeak()
+        backend = espeak if espeak.available() else EQA_Tone()
+        fallback = None if backend.name == "tone" else EQA_Tone()
+    try:
+        backend.save(phrase, path)
+    except Exception as e:
+        if fallback is None:
+            raise
+        eqa_settings.log("tts: " + backend.name + " failed: " + str(e))
+        fallback.save(phrase, path)
+
+
+def cache_bytes(config):
+    """Configured bound on the phrase cache in bytes"""
+    cache_mb = config["settings"].get("tts", {}).get("cache_mb", CACHE_MB)
+    try:
+        return max(int(float(cache_mb) * 1048576), 0)
+    except (TypeError, ValueError):
+        eqa_settings.log(
+            "tts: Bad cache_mb " + str(cache_mb) + ", using " + str(CACHE_MB)
+        )
+        return CACHE_MB * 1048576
+
+
+def prewarm_phrases(config):
+    """Phrases that can be spoken before they are needed, most urgent first"""
+    phrases = []
+    for settings in config["line"].values():
+        for keyphrase, value in settings["alert"].items():
+            if value == "raid":
+                phrases.append(keyphrase)
+    phrases.extend(STATUS_PHRASES)
+    phrases.extend(zone for zone, raid in config["zones"].items() if raid == "raid")
+    phrases.extend(zone for zone, raid in config["zones"].items() if raid != "raid")
+    for char_log in config["char_logs"].values():
+        phrases.append(
+            "Character changed to " + char_log["char"] + " on " + char_log["server"]
+        )
+
+    return list(OrderedDict.fromkeys(phrases))
+
+
+def prewarm(snapshots, phrases, exit_flag, idle):
+    """
+    Synthesize missing phrases of each published snapshot in the
+    background, only while idle() says no sound is waiting or playing
+    """
+    try:
+        version = None
+        while not exit_flag.is_set():
+            snapshot = snapshots.current
+            if snapshot.version != version:
+                version = snapshot.version
+                made = 0
+                failures = 0
+                for phrase in prewarm_phrases(snapshot.config):
+                    if exit_flag.is_set() or snapshots.current.version != version:
+                        break
+                    if phrases.has(phrase):
+                        continue
+                    if phrases.full(PREWARM_SHARE):
+                        eqa_settings.log("tts prewarm: Cache full, stopping")
+                        break
+                    while not idle() and not exit_flag.is_set():
+                        exit_flag.wait(0.1)
+                    if phrases.path(phrase, prewarm=True) is None:
+                        failures += 1
+                        if failures >= PREWARM_FAILURES:
+                            eqa_settings.log("tts prewarm: Synthesis failing, stopping")
+                            break
+                    else:
+                        failures = 0
+                        made += 1
+                if made:
+                    eqa_settings.log("tts prewarm: Made " + str(made) + " phrases")
+            exit_flag.wait(PREWARM_POLL)
+
+    except Exception as e:
+        eqa_settings.log(
+            "tts prewarm: Error on line "
+            + str(sys.exc_info()[-1].tb_lineno)
+            + ": "
+            + str(e)
+        )
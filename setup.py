@@ -10,7 +10,8 @@ setup(
         "gtts",
     ],
     python_requires=">3",
-    packages=["eqa", "eqa.lib"],
+    packages=["eqa", "eqa.bench", "eqa.lib"],
+    package_data={"eqa.bench": ["golden.jsonl"]},
     license="LICENSE.txt",
     entry_points={
         "console_scripts": [